@@ -0,0 +1,218 @@
+"""Admission control: per-class concurrency limits, priority-ordered queueing with deadlines,
+and per-user token buckets, so logins and chat stay fast when the server is saturated.
+
+Routes declare a class via a dependency, e.g. `Depends(admit("chat"))`. Classes with a lower
+priority number are served first, and low-priority classes may only use a share of the
+global capacity, so a burst of uploads cannot occupy the slots logins need.
+"""
+import asyncio
+import itertools
+import math
+import os
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+
+from fastapi import Depends, HTTPException, Request
+
+from app.auth.deps import get_current_user
+from app.metrics import ADMISSION_INFLIGHT, ADMISSION_REJECTED, ADMISSION_WAIT
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+@dataclass
+class RouteClass:
+    name: str
+    priority: int  # lower is served first
+    limit: int  # max concurrent requests in this class
+    share: float  # fraction of global capacity this class may occupy
+    deadline: float  # max seconds to wait for a slot before 503
+    max_queue: int  # waiters beyond this are rejected immediately with 503
+    rate: float  # per-user sustained requests/second
+    burst: int  # per-user burst size
+    in_flight: int = 0
+    waiting: int = 0
+
+
+def _route_class(name: str, priority: int, limit: int, share: float, deadline: float,
+                 max_queue: int, rate: float, burst: int) -> RouteClass:
+    """Defaults overridable per class, e.g. ADMISSION_CHAT_LIMIT=32, ADMISSION_INGEST_RATE=0.5."""
+    prefix = f"ADMISSION_{name.upper()}_"
+    return RouteClass(
+        name=name,
+        priority=priority,
+        limit=int(_env_float(prefix + "LIMIT", limit)),
+        share=_env_float(prefix + "SHARE", share),
+        deadline=_env_float(prefix + "DEADLINE", deadline),
+        max_queue=int(_env_float(prefix + "MAX_QUEUE", max_queue)),
+        rate=_env_float(prefix + "RATE", rate),
+        burst=int(_env_float(prefix + "BURST", burst)),
+    )
+
+
+ROUTE_CLASSES = {
+    c.name: c
+    for c in (
+        _route_class("auth", 0, limit=16, share=1.0, deadline=2.0, max_queue=64, rate=2.0, burst=10),
+        _route_class("chat", 1, limit=16, share=0.9, deadline=5.0, max_queue=64, rate=1.0, burst=5),
+        _route_class("query", 2, limit=8, share=0.75, deadline=5.0, max_queue=32, rate=1.0, burst=5),
+        _route_class("face", 2, limit=4, share=0.75, deadline=3.0, max_queue=16, rate=5.0, burst=10),
+        _route_class("ingest", 3, limit=2, share=0.5, deadline=10.0, max_queue=8, rate=0.2, burst=3),
+    )
+}
+
+
+@dataclass(order=True)
+class _Waiter:
+    priority: int
+    seq: int
+    route: RouteClass = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+
+
+class AdmissionController:
+    """Global slot pool shared by all classes. One instance per worker process."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.in_flight = 0
+        self._waiters: list[_Waiter] = []
+        self._seq = itertools.count()
+
+    def _admissible(self, route: RouteClass) -> bool:
+        return route.in_flight < route.limit and self.in_flight < math.ceil(self.capacity * route.share)
+
+    def _grant(self, route: RouteClass) -> None:
+        route.in_flight += 1
+        self.in_flight += 1
+        ADMISSION_INFLIGHT.labels(route.name).set(route.in_flight)
+
+    def _reject(self, route: RouteClass, reason: str) -> HTTPException:
+        ADMISSION_REJECTED.labels(route.name, reason).inc()
+        return HTTPException(
+            status_code=503,
+            detail="Server is busy. Please retry shortly.",
+            headers={"Retry-After": str(max(1, math.ceil(route.deadline / 2)))},
+        )
+
+    async def acquire(self, route: RouteClass) -> None:
+        """Take a slot for `route`, waiting up to its deadline. Raises HTTPException(503) when shed."""
+        start = time.perf_counter()
+        # Don't jump ahead of equal/higher-priority waiters held back by global capacity
+        # (waiters blocked only by their own class limit don't compete for our slot).
+        ahead = any(
+            w.priority <= route.priority and w.route.in_flight < w.route.limit for w in self._waiters
+        )
+        if not ahead and self._admissible(route):
+            self._grant(route)
+            ADMISSION_WAIT.labels(route.name).observe(0.0)
+            return
+        if route.waiting >= route.max_queue:
+            raise self._reject(route, "queue_full")
+
+        waiter = _Waiter(route.priority, next(self._seq), route, asyncio.get_running_loop().create_future())
+        self._waiters.append(waiter)
+        self._waiters.sort()
+        route.waiting += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), timeout=route.deadline)
+        except asyncio.TimeoutError:
+            if waiter.future.done():  # Granted as the deadline hit: hand the slot back
+                self.release(route)
+            raise self._reject(route, "deadline")
+        except asyncio.CancelledError:
+            if waiter.future.done():
+                self.release(route)
+            raise
+        finally:
+            route.waiting -= 1
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+        ADMISSION_WAIT.labels(route.name).observe(time.perf_counter() - start)
+
+    def release(self, route: RouteClass) -> None:
+        route.in_flight -= 1
+        self.in_flight -= 1
+        ADMISSION_INFLIGHT.labels(route.name).set(route.in_flight)
+        for waiter in list(self._waiters):
+            if waiter.future.done():
+                continue
+            if self._admissible(waiter.route):
+                self._waiters.remove(waiter)
+                self._grant(waiter.route)
+                waiter.future.set_result(None)
+
+
+class TokenBuckets:
+    """Per-(class, key) token buckets. Idle full buckets are dropped to bound memory."""
+
+    def __init__(self):
+        self._buckets: dict[tuple[str, str], tuple[float, float]] = {}
+
+    def take(self, route: RouteClass, key: str) -> float:
+        """Consume one token. Returns 0 if allowed, else seconds until a token is available."""
+        now = time.monotonic()
+        tokens, updated = self._buckets.get((route.name, key), (route.burst, now))
+        tokens = min(route.burst, tokens + (now - updated) * route.rate)
+        if tokens < 1:
+            self._buckets[(route.name, key)] = (tokens, now)
+            return (1 - tokens) / route.rate if route.rate > 0 else 60.0
+        self._buckets[(route.name, key)] = (tokens - 1, now)
+        if len(self._buckets) > 10_000:
+            self._evict(now)
+        return 0.0
+
+    def _evict(self, now: float) -> None:
+        for key, (tokens, updated) in list(self._buckets.items()):
+            route = ROUTE_CLASSES.get(key[0])
+            if route and tokens + (now - updated) * route.rate >= route.burst:
+                del self._buckets[key]
+
+
+controller = AdmissionController(capacity=int(_env_float("ADMISSION_CAPACITY", 32)))
+buckets = TokenBuckets()
+
+
+@asynccontextmanager
+async def _admitted(route: RouteClass, key: str):
+    retry_after = buckets.take(route, key)
+    if retry_after > 0:
+        ADMISSION_REJECTED.labels(route.name, "rate_limited").inc()
+        raise HTTPException(
+            status_code=429,
+            detail="Too many requests. Please slow down.",
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
+    await controller.acquire(route)
+    try:
+        yield
+    finally:
+        controller.release(route)
+
+
+def admit(name: str):
+    """Dependency for authenticated routes: rate-limited per user, then admitted by class."""
+    route = ROUTE_CLASSES[name]
+
+    async def dependency(current_user: dict = Depends(get_current_user)):
+        async with _admitted(route, current_user["user_id"]):
+            yield
+
+    return dependency
+
+
+def admit_anonymous(name: str):
+    """Dependency for unauthenticated routes (login, registration): rate-limited per client IP."""
+    route = ROUTE_CLASSES[name]
+
+    async def dependency(request: Request):
+        async with _admitted(route, request.client.host if request.client else "unknown"):
+            yield
+
+    return dependency
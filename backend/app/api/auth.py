@@ -1,10 +1,35 @@
 import base64
+import binascii
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
 
+from app.admission import admit_anonymous
 from app.services.auth_service import auth_service
 
-router = APIRouter()
+router = APIRouter(dependencies=[Depends(admit_anonymous("auth"))])
+
+
+def _decode_image(image_b64) -> bytes:
+    """Decode one base64 frame, optionally a data URL."""
+    if not isinstance(image_b64, str) or not image_b64:
+        raise ValueError("Each image must be a non-empty base64 string")
+    if "," in image_b64:
+        image_b64 = image_b64.split(",")[1]
+    try:
+        return base64.b64decode(image_b64)
+    except binascii.Error:
+        raise ValueError("Image is not valid base64")
+
+
+def _decode_images(body: dict) -> list[bytes]:
+    """Decode 'images' (list of base64 frames) or a single 'image' from the request body."""
+    frames = body.get("images") or ([body["image"]] if body.get("image") else [])
+    if not isinstance(frames, list):
+        raise ValueError("'images' must be a list of base64 strings")
+    limit = auth_service.max_enroll_frames()
+    if len(frames) > limit:
+        raise ValueError(f"Too many images: {len(frames)} (at most {limit})")
+    return [_decode_image(image_b64) for image_b64 in frames]
 
 
 @router.post("/validate")
@@ -14,26 +39,24 @@ async def validate_face(body: dict):
     if not image_b64:
         raise HTTPException(status_code=400, detail="Face image is required")
     try:
-        if "," in image_b64:
-            image_b64 = image_b64.split(",")[1]
-        data = base64.b64decode(image_b64)
+        data = _decode_image(image_b64)
         result = await auth_service.validate_face(data)
         return result
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.post("/register-face")
 async def register_face(body: dict):
-    """Store face after validation. Returns temp user. Then call register-complete with name."""
-    image_b64 = body.get("image")
-    if not image_b64:
+    """Store face after validation. Accepts 'image' or several 'images' (best frames are kept).
+    Returns temp user. Then call register-complete with name."""
+    if not body.get("image") and not body.get("images"):
         raise HTTPException(status_code=400, detail="Face image is required")
     try:
-        if "," in image_b64:
-            image_b64 = image_b64.split(",")[1]
-        data = base64.b64decode(image_b64)
-        result = await auth_service.register_face(data)
+        images = _decode_images(body)
+        result = await auth_service.register_face(images)
         return result
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -59,16 +82,13 @@ async def register_complete(body: dict):
 
 @router.post("/register")
 async def register(body: dict):
-    """Register with face (required) and optional name. One-shot (legacy)."""
-    image_b64 = body.get("image")
+    """Register with face (required) and optional name. One-shot (legacy). Accepts 'image' or 'images'."""
     name = body.get("name")
-    if not image_b64:
+    if not body.get("image") and not body.get("images"):
         raise HTTPException(status_code=400, detail="Face image is required")
     try:
-        if "," in image_b64:
-            image_b64 = image_b64.split(",")[1]
-        data = base64.b64decode(image_b64)
-        result = await auth_service.register(data, name)
+        images = _decode_images(body)
+        result = await auth_service.register(images, name)
         return result
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -83,9 +103,7 @@ async def login(body: dict):
     if not image_b64:
         raise HTTPException(status_code=400, detail="Face image is required")
     try:
-        if "," in image_b64:
-            image_b64 = image_b64.split(",")[1]
-        data = base64.b64decode(image_b64)
+        data = _decode_image(image_b64)
         result = await auth_service.login(data)
         return result
     except ValueError as e:
@@ -1,5 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException
 
+from app.admission import admit
 from app.auth.deps import get_current_user
 from app.config import OPENAI_API_KEY
 from app.services.chat_service import chat_service
@@ -7,7 +8,7 @@ from app.services.chat_service import chat_service
 router = APIRouter()
 
 
-@router.post("/message")
+@router.post("/message", dependencies=[Depends(admit("chat"))])
 async def chat_message(
     messages: list[dict],
     current_user: dict = Depends(get_current_user),
@@ -1,6 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException, UploadFile
 from pydantic import BaseModel
 
+from app.admission import admit
 from app.auth.deps import get_current_user
 from app.services.doc_service import doc_service
 
@@ -11,7 +12,7 @@ class QueryRequest(BaseModel):
     question: str
 
 
-@router.post("/upload")
+@router.post("/upload", dependencies=[Depends(admit("ingest"))])
 async def upload_document(
     file: UploadFile,
     current_user: dict = Depends(get_current_user),
@@ -31,7 +32,7 @@ async def upload_document(
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.post("/query")
+@router.post("/query", dependencies=[Depends(admit("query"))])
 async def query_documents(
     req: QueryRequest,
     current_user: dict = Depends(get_current_user),
@@ -44,7 +45,22 @@ async def query_documents(
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.get("/list")
+@router.delete("/{doc_id}", dependencies=[Depends(admit("ingest"))])
+async def delete_document(
+    doc_id: str,
+    current_user: dict = Depends(get_current_user),
+):
+    """Delete an uploaded document and its indexed chunks."""
+    try:
+        removed = await doc_service.delete(doc_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if not removed:
+        raise HTTPException(status_code=404, detail="Document not found")
+    return {"status": "deleted", "doc_id": doc_id}
+
+
+@router.get("/list", dependencies=[Depends(admit("query"))])
 async def list_documents(
     current_user: dict = Depends(get_current_user),
 ):
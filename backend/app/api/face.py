@@ -1,10 +1,11 @@
 import base64
 import io
-from fastapi import APIRouter, HTTPException, UploadFile
+from fastapi import APIRouter, Depends, HTTPException, UploadFile
 
+from app.admission import admit_anonymous
 from app.services.face_service import face_service
 
-router = APIRouter()
+router = APIRouter(dependencies=[Depends(admit_anonymous("face"))])
 
 
 @router.post("/analyze")
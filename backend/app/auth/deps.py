@@ -1,17 +1,7 @@
 """Auth dependencies for protected routes."""
-import json
-from pathlib import Path
-
 from fastapi import Header, HTTPException
 
-USERS_FILE = Path("./data/users.json")
-
-
-def _load_users() -> dict:
-    if not USERS_FILE.exists():
-        return {}
-    with open(USERS_FILE) as f:
-        return json.load(f)
+from app.services.auth_service import cached_users
 
 
 async def get_current_user(
@@ -31,7 +21,7 @@ async def get_current_user(
             detail="Authentication required. Provide Authorization: Bearer <token> or X-User-Token header.",
         )
 
-    users = _load_users()
+    users, _ = cached_users()
     if token not in users:
         raise HTTPException(status_code=401, detail="Invalid or expired token.")
 
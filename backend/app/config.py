@@ -13,3 +13,15 @@ CREATOR_LOCATION = "Noida"
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 CHROMA_PERSIST_DIR = Path(os.getenv("CHROMA_PERSIST_DIR", "./data/chroma"))
 UPLOAD_DIR = Path(os.getenv("UPLOAD_DIR", "./data/uploads"))
+
+# Document vector store: "chroma" (default) or "numpy" (embedded, memory-mapped, int8/float16)
+VECTOR_STORE = os.getenv("VECTOR_STORE", "chroma")
+VECTOR_STORE_DIR = Path(os.getenv("VECTOR_STORE_DIR", "./data/vectors"))
+# Chroma server (chroma run --path ...). Unset: embedded PersistentClient in CHROMA_PERSIST_DIR,
+# whose in-memory index is per process, so it only supports a single worker.
+CHROMA_HOST = os.getenv("CHROMA_HOST")
+CHROMA_PORT = int(os.getenv("CHROMA_PORT", "8000"))
+
+# Startup warm-up of detector, galleries, embedder and vector store:
+# "background" (serve immediately, /ready reports progress), "blocking" (finish before serving) or "off".
+WARMUP_MODE = os.getenv("WARMUP_MODE", "background").strip().lower()
@@ -0,0 +1,125 @@
+"""Document embedding model, in process or shared by all workers.
+
+With several production workers, run.py starts one embedding server process that loads the
+model once, and exports its address (EMBEDDING_SERVER) and key (EMBEDDING_SERVER_KEY). Workers
+then embed through RemoteEmbeddings over a local socket and never import torch themselves.
+"""
+import os
+import threading
+import time
+from multiprocessing.connection import Client, Listener
+
+MODEL_NAME = "all-MiniLM-L6-v2"
+CONNECT_TIMEOUT = 120.0  # Workers may start before the server has bound its socket
+
+
+def load_model():
+    """The local sentence-transformers model (imports torch)."""
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+
+    return HuggingFaceEmbeddings(model_name=MODEL_NAME, model_kwargs={"device": "cpu"})
+
+
+def parse_address(address: str):
+    """'host:port' for TCP, anything else is a Unix socket path."""
+    host, sep, port = address.rpartition(":")
+    return (host, int(port)) if sep and port.isdigit() else address
+
+
+def serve(address: str, authkey: str) -> None:
+    """Serve embed requests until killed. Connections are accepted while the model loads;
+    requests wait for it."""
+    ready = threading.Event()
+    model = {}
+    lock = threading.Lock()  # One encode at a time; torch parallelizes each batch itself
+
+    def handle(conn) -> None:
+        with conn:
+            while True:
+                try:
+                    op, payload = conn.recv()
+                except (EOFError, OSError):
+                    return
+                ready.wait()
+                try:
+                    if "error" in model:
+                        raise RuntimeError(f"model failed to load: {model['error']}")
+                    with lock:
+                        if op == "documents":
+                            result = model["model"].embed_documents(payload)
+                        else:
+                            result = model["model"].embed_query(payload)
+                    conn.send(("ok", result))
+                except Exception as e:
+                    conn.send(("error", str(e)))
+
+    def accept(listener) -> None:
+        while True:
+            try:
+                conn = listener.accept()
+            except Exception:
+                continue  # Failed handshake (wrong key); keep serving
+            threading.Thread(target=handle, args=(conn,), daemon=True).start()
+
+    parsed = parse_address(address)
+    if isinstance(parsed, str) and os.path.exists(parsed):
+        os.unlink(parsed)  # Stale socket from a previous run
+    listener = Listener(parsed, authkey=bytes.fromhex(authkey))
+    threading.Thread(target=accept, args=(listener,), daemon=True).start()
+    try:
+        model["model"] = load_model()
+        model["model"].embed_query("warmup")
+    except Exception as e:
+        model["error"] = str(e)  # Keep serving, so workers report it instead of timing out
+    ready.set()
+    threading.Event().wait()
+
+
+class RemoteEmbeddings:
+    """embed_documents/embed_query against the shared embedding server, one connection per thread."""
+
+    def __init__(self, address: str, authkey: str):
+        self.address = parse_address(address)
+        self.authkey = bytes.fromhex(authkey)
+        self._local = threading.local()
+
+    def _connect(self):
+        deadline = time.monotonic() + CONNECT_TIMEOUT
+        while True:
+            try:
+                return Client(self.address, authkey=self.authkey)
+            except (FileNotFoundError, ConnectionRefusedError):
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"Embedding server not reachable at {self.address}")
+                time.sleep(0.5)
+
+    def _call(self, op: str, payload):
+        for attempt in range(2):
+            conn = getattr(self._local, "conn", None)
+            if conn is None:
+                conn = self._local.conn = self._connect()
+            try:
+                conn.send((op, payload))
+                status, result = conn.recv()
+                break
+            except (EOFError, OSError):
+                self._local.conn = None  # Server restarted or connection dropped; reconnect once
+                if attempt:
+                    raise
+        if status != "ok":
+            raise RuntimeError(f"Embedding server error: {result}")
+        return result
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self._call("documents", list(texts))
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._call("query", text)
+
+
+def create_embeddings():
+    """RemoteEmbeddings when an embedding server is configured, else the local model."""
+    address = os.getenv("EMBEDDING_SERVER")
+    if address:
+        return RemoteEmbeddings(address, os.environ["EMBEDDING_SERVER_KEY"])
+    return load_model()
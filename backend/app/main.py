@@ -1,13 +1,61 @@
-from fastapi import FastAPI
+import asyncio
+import contextlib
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 
+from app import metrics, warmup
 from app.api import auth, chat, face, documents
-from app.config import APP_VERSION
+from app.config import APP_VERSION, OPENAI_API_KEY, WARMUP_MODE
+from app.services.auth_service import auth_service
+from app.services.chat_service import chat_service
+from app.services.doc_service import doc_service
+from app.services.face_gallery import face_detector
+from app.services.face_service import face_service
+
+
+def _warmup_components() -> dict:
+    components = {
+        "face_detector": face_detector.warm,
+        "face_gallery": lambda: (face_service.gallery.warm(), auth_service.gallery.warm()),
+        "embedder": doc_service.warm_embedder,
+        "vector_store": doc_service.warm_vector_store,
+    }
+    if OPENAI_API_KEY:
+        components["llm_client"] = lambda: chat_service.client
+    return components
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Warm heavy components in parallel so no user request pays for cold loading, and sample
+    this worker's thread pool for /metrics."""
+    sampler = asyncio.create_task(metrics.sample_executor())
+    task = None
+    if WARMUP_MODE != "off":
+        components = _warmup_components()
+        if WARMUP_MODE == "blocking":
+            await warmup.warm_all(components)
+        else:
+            warmup.plan(components)
+            task = asyncio.create_task(warmup.warm_all(components))
+    yield
+    for background in (task, sampler):
+        if background and not background.done():
+            background.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await background
+    metrics.mark_worker_exit()
+
 
 app = FastAPI(
     title="J.A.R.V.I.S. API",
     description="Just A Rather Very Intelligent System",
     version=APP_VERSION,
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -18,6 +66,23 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+@app.middleware("http")
+async def record_metrics(request: Request, call_next):
+    """Count requests and record latency per route template (not raw path, to bound cardinality)."""
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        path = getattr(route, "path", "unmatched")
+        metrics.REQUEST_LATENCY.labels(request.method, path).observe(time.perf_counter() - start)
+        metrics.REQUEST_COUNT.labels(request.method, path, str(status)).inc()
+
+
 app.include_router(auth.router, prefix="/api/auth", tags=["auth"])
 app.include_router(chat.router, prefix="/api/chat", tags=["chat"])
 app.include_router(face.router, prefix="/api/face", tags=["face"])
@@ -32,3 +97,17 @@ async def root():
 @app.get("/health")
 async def health():
     return {"status": "ok"}
+
+
+@app.get("/ready")
+async def ready():
+    """Readiness: 200 once every warm-up component is loaded, 503 while warming or on error."""
+    status = warmup.readiness()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    metrics.observe_executor()
+    body, content_type = metrics.render()
+    return Response(content=body, headers={"Content-Type": content_type})
@@ -0,0 +1,125 @@
+"""Prometheus metrics: HTTP request counts/latency, internal stage timings and capacity gauges.
+
+With several workers, run.py sets PROMETHEUS_MULTIPROC_DIR and /metrics aggregates all of them."""
+import asyncio
+import os
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+EXECUTOR_SAMPLE_INTERVAL = 1.0  # Seconds between thread pool samples in each worker
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+REQUEST_COUNT = Counter(
+    "jarvis_http_requests_total",
+    "HTTP requests by route template and status code.",
+    ["method", "route", "status"],
+)
+REQUEST_LATENCY = Histogram(
+    "jarvis_http_request_duration_seconds",
+    "HTTP request latency by route template.",
+    ["method", "route"],
+    buckets=LATENCY_BUCKETS,
+)
+STAGE_LATENCY = Histogram(
+    "jarvis_stage_duration_seconds",
+    "Latency of internal processing stages (decode, detect, gallery_match, extract_text, "
+    "chunk, embed, vector_query, llm).",
+    ["stage"],
+    buckets=LATENCY_BUCKETS,
+)
+GALLERY_SIZE = Gauge(
+    "jarvis_face_gallery_size",
+    "Labels (users or names) in a face gallery.",
+    ["gallery"],
+    multiprocess_mode="max",
+)
+GALLERY_SAMPLES = Gauge(
+    "jarvis_face_gallery_samples",
+    "Face templates stored in a face gallery.",
+    ["gallery"],
+    multiprocess_mode="max",
+)
+VECTOR_COUNT = Gauge(
+    "jarvis_vector_count",
+    "Chunk vectors in the document vector store.",
+    multiprocess_mode="max",
+)
+EXECUTOR_QUEUE_DEPTH = Gauge(
+    "jarvis_executor_queue_depth",
+    "Tasks waiting for a worker thread in the request thread pool.",
+    multiprocess_mode="livesum",
+)
+EXECUTOR_BUSY = Gauge(
+    "jarvis_executor_busy_threads",
+    "Worker threads currently busy in the request thread pool.",
+    multiprocess_mode="livesum",
+)
+CACHE_REQUESTS = Counter(
+    "jarvis_cache_requests_total",
+    "In-process cache lookups by cache and result (hit or miss).",
+    ["cache", "result"],
+)
+CACHE_ENTRIES = Gauge(
+    "jarvis_cache_entries",
+    "Entries held by an in-process cache.",
+    ["cache"],
+    multiprocess_mode="livesum",
+)
+ADMISSION_INFLIGHT = Gauge(
+    "jarvis_admission_in_flight",
+    "Admitted requests currently running, by admission class.",
+    ["route_class"],
+    multiprocess_mode="livesum",
+)
+ADMISSION_WAIT = Histogram(
+    "jarvis_admission_wait_seconds",
+    "Time admitted requests spent queued for a slot, by admission class.",
+    ["route_class"],
+    buckets=LATENCY_BUCKETS,
+)
+ADMISSION_REJECTED = Counter(
+    "jarvis_admission_rejected_total",
+    "Requests shed by admission control (rate_limited=429, queue_full/deadline=503).",
+    ["route_class", "reason"],
+)
+
+
+def stage(name: str):
+    """Time a block (or decorate a function) as an internal stage: `with stage("embed"): ...`."""
+    return STAGE_LATENCY.labels(name).time()
+
+
+def observe_executor() -> None:
+    """Sample the thread pool used for sync endpoints and file I/O. Call from the event loop."""
+    from anyio.to_thread import current_default_thread_limiter
+
+    stats = current_default_thread_limiter().statistics()
+    EXECUTOR_QUEUE_DEPTH.set(stats.tasks_waiting)
+    EXECUTOR_BUSY.set(stats.borrowed_tokens)
+
+
+async def sample_executor(interval: float = EXECUTOR_SAMPLE_INTERVAL) -> None:
+    """Sample the thread pool every `interval` seconds until cancelled. Run one per worker: a
+    scrape reaches only one worker, and the livesum gauges add up every worker's last sample."""
+    while True:
+        observe_executor()
+        await asyncio.sleep(interval)
+
+
+def render() -> tuple[bytes, str]:
+    """Current metrics in the Prometheus text format, with its content type."""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import CollectorRegistry, multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+def mark_worker_exit() -> None:
+    """Drop this worker's live gauges from the multiprocess aggregate."""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(os.getpid())
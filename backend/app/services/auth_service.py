@@ -1,14 +1,33 @@
+from __future__ import annotations
+
 import json
 import os
+import threading
 import uuid
 from datetime import datetime
 from pathlib import Path
 
-import cv2
-import numpy as np
+from anyio import to_thread
+
+from app.lazy import LazyModule
+from app.services.face_gallery import (
+    FACE_SIZE,
+    FACES_DERIVATIVE,
+    FaceGallery,
+    decode_image,
+    encode_faces,
+    face_detector,
+    face_template,
+    normalize_face,
+    to_templates,
+)
+from app.storage import BlobStore, write_atomic
+
+cv2 = LazyModule("cv2")
+np = LazyModule("numpy")
 
 USERS_FILE = Path("./data/users.json")
-AUTH_FACES_DIR = Path("./data/auth_faces")
+AUTH_FACES_DIR = Path("./data/auth_faces")  # Flat <user_id>.jpg files here are legacy; new images go to blobs/
 AUTH_FACES_DIR.mkdir(parents=True, exist_ok=True)
 
 
@@ -21,30 +40,49 @@ def _load_users() -> dict:
 
 
 def _save_users(users: dict) -> None:
-    USERS_FILE.parent.mkdir(parents=True, exist_ok=True)
-    with open(USERS_FILE, "w") as f:
-        json.dump(users, f, indent=2)
+    write_atomic(USERS_FILE, json.dumps(users, indent=2).encode())
+
+
+_users_lock = threading.Lock()
+_users_cache: tuple = (None, {}, frozenset())  # (file signature, users, pending user ids)
+
+
+def _users_signature():
+    try:
+        st = os.stat(USERS_FILE)
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+
+def cached_users() -> tuple[dict, frozenset]:
+    """Users and the ids of pending registrations, re-parsed only when users.json changes (also
+    when another worker rewrites it). Read-only: load a fresh copy with _load_users() to modify."""
+    global _users_cache
+    signature = _users_signature()
+    if signature is None:
+        return {}, frozenset()
+    if signature != _users_cache[0]:
+        with _users_lock:
+            if signature != _users_cache[0]:
+                users = _load_users()
+                pending = frozenset(uid for uid, data in users.items() if data.get("pending_name"))
+                _users_cache = (signature, users, pending)
+    return _users_cache[1], _users_cache[2]
 
 
 class AuthService:
     def __init__(self):
-        self.face_cascade = cv2.CascadeClassifier(
-            cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
-        )
-
-    def _decode_image(self, image_data: bytes) -> "np.ndarray | None":
-        nparr = np.frombuffer(image_data, np.uint8)
-        return cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        self.blobs = BlobStore(AUTH_FACES_DIR / "blobs")
+        self.gallery = FaceGallery("auth", AUTH_FACES_DIR / "gallery", self.blobs, face_detector.extract, AUTH_FACES_DIR)
 
     def _ensure_face(self, image_data: bytes) -> tuple[np.ndarray, np.ndarray]:
         """Decode image and ensure exactly one face. Raises ValueError otherwise."""
-        img = self._decode_image(image_data)
+        img = decode_image(image_data)
         if img is None:
             raise ValueError("Invalid image")
         gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        faces = self.face_cascade.detectMultiScale(
-            gray, scaleFactor=1.1, minNeighbors=5, minSize=(30, 30)
-        )
+        faces = face_detector.detect(gray)
         if len(faces) == 0:
             raise ValueError("No face detected. Please ensure your face is visible.")
         if len(faces) > 1:
@@ -53,21 +91,47 @@ class AuthService:
         face_roi = gray[y : y + h, x : x + w]
         return gray, face_roi
 
+    def _measure_face(self, gray: np.ndarray, face_roi: np.ndarray) -> dict:
+        """Aspect, relative size and sharpness (Laplacian variance) of a face crop from `gray`."""
+        h, w = face_roi.shape[:2]
+        return {
+            "aspect": w / h if h > 0 else 0,
+            "area_ratio": face_roi.size / gray.size,
+            "width": int(w),
+            "laplacian_var": float(cv2.Laplacian(face_roi, cv2.CV_64F).var()),
+        }
+
+    def _quality_score(self, m: dict) -> float:
+        """0..1 enrollment quality from sharpness, size and aspect. Higher is better."""
+        sharpness = min(m["laplacian_var"] / 100.0, 1.0)
+        ratio = m["area_ratio"]
+        size = min(ratio / 0.1, 1.0) if ratio <= 0.5 else max(0.0, (0.8 - ratio) / 0.3)
+        size *= min(m["width"] / FACE_SIZE[0], 1.0)
+        aspect = max(0.0, 1.0 - abs(m["aspect"] - 0.85) / 0.65)
+        return round(sharpness * size * aspect, 3)
+
+    def _get_blur_threshold(self) -> "int | None":
+        """Blur check - disabled by default; set BLUR_THRESHOLD=50 in .env to enable."""
+        try:
+            return int(os.environ["BLUR_THRESHOLD"]) if os.environ.get("BLUR_THRESHOLD") else None
+        except ValueError:
+            return None
+
     async def validate_face(self, image_data: bytes) -> dict:
         """
         Validate face shape and human face patterns. Auto-runs when camera is on.
-        Returns { valid: bool, message: str, face_info?: dict }.
+        Returns { valid: bool, message: str, face_info?: dict, quality?: float }.
         """
-        img = self._decode_image(image_data)
+        return await to_thread.run_sync(self._validate_face, image_data)
+
+    def _validate_face(self, image_data: bytes) -> dict:
+        img = decode_image(image_data)
         if img is None:
             return {"valid": False, "message": "Invalid image"}
 
         gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        img_h, img_w = gray.shape[:2]
 
-        faces = self.face_cascade.detectMultiScale(
-            gray, scaleFactor=1.1, minNeighbors=5, minSize=(50, 50)
-        )
+        faces = face_detector.detect(gray, min_size=(50, 50))
 
         if len(faces) == 0:
             return {"valid": False, "message": "No face detected. Position your face in frame."}
@@ -76,127 +140,133 @@ class AuthService:
             return {"valid": False, "message": "Multiple faces. Ensure only you are visible."}
 
         x, y, w, h = faces[0]
+        face_roi = gray[y : y + h, x : x + w]
+        m = self._measure_face(gray, face_roi)
 
         # Face aspect ratio - human faces are roughly 0.7 to 1.0 (width/height)
-        aspect = w / h if h > 0 else 0
-        if aspect < 0.5 or aspect > 1.5:
+        if m["aspect"] < 0.5 or m["aspect"] > 1.5:
             return {"valid": False, "message": "Face angle not ideal. Look straight at camera."}
 
-        # Face size - should be at least 10% of image
-        face_area = w * h
-        img_area = img_w * img_h
-        if face_area < img_area * 0.05:
+        # Face size - should be at least 5% of image
+        if m["area_ratio"] < 0.05:
             return {"valid": False, "message": "Move closer. Face is too small."}
-        if face_area > img_area * 0.8:
+        if m["area_ratio"] > 0.8:
             return {"valid": False, "message": "Move back slightly. Face too close."}
 
-        # Blur check - disabled by default; set BLUR_THRESHOLD=50 in .env to enable
-        if os.environ.get("BLUR_THRESHOLD"):
-            try:
-                threshold = int(os.environ["BLUR_THRESHOLD"])
-                face_roi = gray[y : y + h, x : x + w]
-                laplacian_var = cv2.Laplacian(face_roi, cv2.CV_64F).var()
-                if laplacian_var < threshold:
-                    return {"valid": False, "message": "Image too blurry. Hold steady or improve lighting."}
-            except (ValueError, KeyError):
-                pass
+        blur_threshold = self._get_blur_threshold()
+        if blur_threshold is not None and m["laplacian_var"] < blur_threshold:
+            return {"valid": False, "message": "Image too blurry. Hold steady or improve lighting."}
 
         result = {
             "valid": True,
             "message": "Face verified",
             "face_info": {"x": int(x), "y": int(y), "width": int(w), "height": int(h)},
+            "quality": self._quality_score(m),
         }
-        face_roi = gray[y : y + h, x : x + w]
         threshold = self._get_match_threshold()
-        existing_id, score = self._match_face(face_roi)
+        existing_id, score = self._match_face(face_template(face_roi))
         if existing_id and score >= threshold:
-            users = _load_users()
+            users, _ = cached_users()
             result["already_registered"] = True
             result["existing_name"] = users.get(existing_id, {}).get("name", "Unknown")
         return result
 
     def _get_match_threshold(self) -> float:
-        """Match threshold; lower = more lenient. Default 0.4. Set FACE_MATCH_THRESHOLD in .env."""
+        """Minimum template correlation for login; lower = more lenient. Set FACE_MATCH_CORRELATION in .env.
+        The default sits above the best impostor scores of benchmarks.face_bench."""
         try:
-            return float(os.environ.get("FACE_MATCH_THRESHOLD", "0.4"))
+            return float(os.environ.get("FACE_MATCH_CORRELATION", "0.88"))
         except (ValueError, TypeError):
-            return 0.4
+            return 0.88
 
-    FACE_SIZE = (100, 100)  # Normalized size for consistent matching
+    def _get_templates_per_user(self) -> int:
+        """Best K enrollment frames kept per user. Set FACE_TEMPLATES_PER_USER in .env."""
+        try:
+            return max(1, int(os.environ.get("FACE_TEMPLATES_PER_USER", "5")))
+        except (ValueError, TypeError):
+            return 5
 
-    def _normalize_face(self, face_roi: np.ndarray) -> np.ndarray:
-        """Normalize face for robust matching: resize, histogram equalization."""
-        resized = cv2.resize(face_roi, self.FACE_SIZE, interpolation=cv2.INTER_AREA)
-        return cv2.equalizeHist(resized)
+    def max_enroll_frames(self) -> int:
+        """Most frames accepted per enrollment request; default 4x FACE_TEMPLATES_PER_USER. Set FACE_MAX_ENROLL_FRAMES in .env."""
+        try:
+            return max(1, int(os.environ.get("FACE_MAX_ENROLL_FRAMES", "0")) or 4 * self._get_templates_per_user())
+        except (ValueError, TypeError):
+            return 4 * self._get_templates_per_user()
 
-    def _extract_face_from_image(self, img: np.ndarray) -> "np.ndarray | None":
-        """Extract face ROI from full image. Returns grayscale face crop or None."""
-        if img is None or img.size == 0:
-            return None
-        gray = img if len(img.shape) == 2 else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        faces = self.face_cascade.detectMultiScale(
-            gray, scaleFactor=1.1, minNeighbors=5, minSize=(30, 30)
-        )
-        if len(faces) == 0:
-            return None
-        x, y, w, h = faces[0]
-        face_roi = gray[y : y + h, x : x + w]
-        return self._normalize_face(face_roi)
+    def _get_pooling(self) -> str:
+        """How a user's template scores combine: 'max' (default) or 'mean'. Set FACE_MATCH_POOLING in .env."""
+        pooling = os.environ.get("FACE_MATCH_POOLING", "max").strip().lower()
+        return pooling if pooling in ("max", "mean") else "max"
 
     def _match_face(
-        self, face_roi: np.ndarray, exclude_user_id: str | None = None, include_pending: bool = False
+        self, templates: np.ndarray, exclude_user_id: str | None = None, include_pending: bool = False
     ) -> tuple[str | None, float]:
-        """Match face against registered users. Returns (user_id, score) or (None, 0).
+        """Match face template(s) against registered users' template sets. Returns (user_id, score) or (None, 0).
         include_pending=False: only completed users (for register duplicate check, validate).
         include_pending=True: all users (for login, so pending registrations can log in).
-        Uses normalized faces for more robust matching across lighting/angle."""
-        users = _load_users()
-        best_match = None
-        best_score = 0.0
-        # Normalize input face for consistent comparison
-        query_face = self._normalize_face(face_roi)
-        for user_id, user_data in users.items():
-            if user_id == exclude_user_id:
-                continue
-            if not include_pending and user_data.get("pending_name"):
-                continue
-            reg_path = AUTH_FACES_DIR / f"{user_id}.jpg"
-            if not reg_path.exists():
-                continue
-            reg_full = cv2.imread(str(reg_path))
-            if reg_full is None:
+        Several query templates (multi-frame enrollment) return the single best match."""
+        users, pending = cached_users()
+        exclude = set() if include_pending else set(pending)
+        if exclude_user_id:
+            exclude.add(exclude_user_id)
+        best_match, best_score = None, 0.0
+        for user_id, score in self.gallery.match(templates, exclude=exclude, pooling=self._get_pooling()):
+            if user_id in users and score > best_score:
+                best_match, best_score = user_id, score
+        return best_match, best_score
+
+    def _select_frames(self, images: list[bytes]) -> tuple[bytes, np.ndarray]:
+        """Score enrollment frames and keep the best K. Frames without exactly one (sharp enough)
+        face are skipped. Returns (best original frame, normalized faces (k, H, W) best-first).
+        Raises ValueError with the first rejection reason if no frame is usable."""
+        blur_threshold = self._get_blur_threshold()
+        scored, errors = [], []
+        for image_data in images:
+            try:
+                gray, face_roi = self._ensure_face(image_data)
+            except ValueError as e:
+                errors.append(str(e))
                 continue
-            reg_face = self._extract_face_from_image(reg_full)
-            if reg_face is None:
+            m = self._measure_face(gray, face_roi)
+            if blur_threshold is not None and m["laplacian_var"] < blur_threshold:
+                errors.append("Image too blurry. Hold steady or improve lighting.")
                 continue
-            diff = np.mean(np.abs(reg_face.astype(float) - query_face.astype(float)))
-            score = 1 / (1 + diff)
-            if score > best_score:
-                best_score = score
-                best_match = user_id
-        return best_match, best_score
+            scored.append((self._quality_score(m), image_data, normalize_face(face_roi)))
+        if not scored:
+            raise ValueError(errors[0] if errors else "Face image is required")
+        scored.sort(key=lambda s: s[0], reverse=True)
+        best = scored[: self._get_templates_per_user()]
+        return best[0][1], np.stack([face for _, _, face in best])
 
-    async def register_face(self, image_data: bytes) -> dict:
-        """Store face first (after validation). Returns temp user for name step."""
-        gray, face_roi = self._ensure_face(image_data)
-        users = _load_users()
-        if users:
+    def _enroll(self, images: list[bytes]) -> tuple[bytes, np.ndarray]:
+        """Select enrollment frames and reject faces that already belong to a completed user."""
+        best_image, faces = self._select_frames(images)
+        if cached_users()[0]:
             threshold = self._get_match_threshold()
-            existing_id, score = self._match_face(face_roi)
+            existing_id, score = self._match_face(to_templates(faces))
             if existing_id and score >= threshold:
-                existing = users[existing_id]
+                existing = cached_users()[0][existing_id]
                 raise ValueError(
                     f"Face already registered as '{existing['name']}'. Please login instead."
                 )
+        return best_image, faces
+
+    async def _store_face(self, user_id: str, image_data: bytes, faces: np.ndarray) -> None:
+        """Keep the best frame, with the user's normalized faces next to it, and enroll them."""
+        await self.blobs.put(image_data, label=user_id, derivatives={FACES_DERIVATIVE: encode_faces(faces)})
+        await to_thread.run_sync(self.gallery.add, user_id, faces)
+
+    async def register_face(self, images: list[bytes]) -> dict:
+        """Store face first (after validation). Accepts several frames; the best K become the
+        user's templates. Returns temp user for name step."""
+        best_image, faces = await to_thread.run_sync(self._enroll, images)
         user_id = str(uuid.uuid4())
         display_name = f"User_{user_id[:8]}"
-        face_path = AUTH_FACES_DIR / f"{user_id}.jpg"
-        with open(face_path, "wb") as f:
-            f.write(image_data)
+        await self._store_face(user_id, best_image, faces)
         users = _load_users()
         users[user_id] = {"name": display_name, "created_at": datetime.utcnow().isoformat(), "pending_name": True}
-        _save_users(users)
-        return {"user_id": user_id, "name": display_name, "token": user_id}
+        await to_thread.run_sync(_save_users, users)
+        return {"user_id": user_id, "name": display_name, "token": user_id, "templates": len(faces)}
 
     async def register_complete(self, user_id: str, name: str | None = None) -> dict:
         """Complete registration with name (called after face stored)."""
@@ -206,44 +276,36 @@ class AuthService:
         display_name = (name or "").strip() or users[user_id]["name"]
         users[user_id]["name"] = display_name
         users[user_id].pop("pending_name", None)
-        _save_users(users)
+        await to_thread.run_sync(_save_users, users)
         return {"user_id": user_id, "name": display_name, "token": user_id}
 
-    async def register(self, image_data: bytes, name: str | None = None) -> dict:
-        """Register user with face (required). Name optional. One-shot registration."""
-        gray, face_roi = self._ensure_face(image_data)
-        users = _load_users()
-        if users:
-            threshold = self._get_match_threshold()
-            existing_id, score = self._match_face(face_roi)
-            if existing_id and score >= threshold:
-                existing = users[existing_id]
-                raise ValueError(
-                    f"Face already registered as '{existing['name']}'. Please login instead."
-                )
+    async def register(self, images: list[bytes], name: str | None = None) -> dict:
+        """Register user with face (required). Name optional. One-shot registration.
+        Accepts several frames; the best K become the user's templates."""
+        best_image, faces = await to_thread.run_sync(self._enroll, images)
         user_id = str(uuid.uuid4())
         display_name = (name or "").strip() or f"User_{user_id[:8]}"
-        face_path = AUTH_FACES_DIR / f"{user_id}.jpg"
-        with open(face_path, "wb") as f:
-            f.write(image_data)
+        await self._store_face(user_id, best_image, faces)
         users = _load_users()
         users[user_id] = {"name": display_name, "created_at": datetime.utcnow().isoformat()}
-        _save_users(users)
-        return {"user_id": user_id, "name": display_name, "token": user_id}
+        await to_thread.run_sync(_save_users, users)
+        return {"user_id": user_id, "name": display_name, "token": user_id, "templates": len(faces)}
 
     async def login(self, image_data: bytes) -> dict:
         """Login with face (required). Returns user if matched. Only matches completed (non-pending) users."""
+        return await to_thread.run_sync(self._login, image_data)
+
+    def _login(self, image_data: bytes) -> dict:
         gray, face_roi = self._ensure_face(image_data)
-        users = _load_users()
-        if not users:
+        if not cached_users()[0]:
             raise ValueError("No users registered. Please register first.")
         threshold = self._get_match_threshold()
-        best_match, best_score = self._match_face(face_roi, include_pending=True)
+        best_match, best_score = self._match_face(face_template(face_roi), include_pending=True)
         if not best_match or best_score < threshold:
             raise ValueError(
                 "Face not recognized. Ensure good lighting, look straight at camera, or complete a pending registration."
             )
-        user = users[best_match]
+        user = cached_users()[0][best_match]  # At least as new as the snapshot that matched
         return {"user_id": best_match, "name": user["name"], "token": best_match}
 
 
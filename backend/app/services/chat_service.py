@@ -1,8 +1,7 @@
 import os
 
-from openai import AsyncOpenAI
-
 from app.config import APP_VERSION, CREATOR_LOCATION, CREATOR_NAME, CREATOR_ROLE
+from app.metrics import stage
 
 _system_prompt = f"""You are J.A.R.V.I.S. (Just A Rather Very Intelligent System), an AI assistant inspired by the one from Iron Man.
 You are helpful, witty, and speak in a professional yet slightly playful tone.
@@ -16,7 +15,15 @@ SYSTEM_PROMPT = _system_prompt
 
 class ChatService:
     def __init__(self):
-        self.client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        self._client = None
+
+    @property
+    def client(self):
+        """OpenAI client, created on first use (the openai package is slow to import)."""
+        if self._client is None:
+            from openai import AsyncOpenAI
+            self._client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        return self._client
 
     async def chat(self, messages: list[dict]) -> str:
         formatted = []
@@ -25,11 +32,12 @@ class ChatService:
             content = m.get("content", "")
             formatted.append({"role": role, "content": content})
 
-        response = await self.client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[{"role": "system", "content": SYSTEM_PROMPT}, *formatted],
-            max_tokens=500,
-        )
+        with stage("llm"):
+            response = await self.client.chat.completions.create(
+                model="gpt-3.5-turbo",
+                messages=[{"role": "system", "content": SYSTEM_PROMPT}, *formatted],
+                max_tokens=500,
+            )
         return response.choices[0].message.content or ""
 
 
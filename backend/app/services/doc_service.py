@@ -1,38 +1,45 @@
 import hashlib
 import io
 import os
+import re
+import threading
 from pathlib import Path
 
-from pypdf import PdfReader
+from anyio import to_thread
 
-from app.config import CHROMA_PERSIST_DIR, UPLOAD_DIR
+from app.config import UPLOAD_DIR
+from app.lazy import LazyModule
+from app.metrics import VECTOR_COUNT, stage
+from app.services.retrieval_cache import LRUCache, get_cache_size, normalize_question
+from app.services.vector_store import create_vector_store
+from app.storage import BlobStore
 
-UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
-CHROMA_PERSIST_DIR.mkdir(parents=True, exist_ok=True)
+np = LazyModule("numpy")
 
-# Lazy import chromadb - can fail if deps not installed
-_chroma_client = None
+UPLOAD_DIR.mkdir(parents=True, exist_ok=True)  # Flat <doc_id>_<filename> files here are legacy
+TEXT_DERIVATIVE = "txt"  # Blob derivative: a document's extracted text (UTF-8)
 
-
-def _get_chroma():
-    global _chroma_client
-    if _chroma_client is None:
-        import chromadb
-        _chroma_client = chromadb.PersistentClient(path=str(CHROMA_PERSIST_DIR))
-    return _chroma_client
+# Lazy import embeddings - can fail if deps not installed.
+# Created once per process (warmed at startup, see app.main lifespan); with several production
+# workers this is a client of the shared embedding server (app.embeddings).
+_embeddings = None
+_init_lock = threading.Lock()
 
 
 def _get_embeddings():
-    from langchain_community.embeddings import HuggingFaceEmbeddings
-    return HuggingFaceEmbeddings(
-        model_name="all-MiniLM-L6-v2",
-        model_kwargs={"device": "cpu"},
-    )
+    global _embeddings
+    if _embeddings is None:
+        with _init_lock:
+            if _embeddings is None:
+                from app.embeddings import create_embeddings
+                _embeddings = create_embeddings()
+    return _embeddings
 
 
 def _extract_text(data: bytes, filename: str) -> str:
     ext = filename.split(".")[-1].lower()
     if ext == "pdf":
+        from pypdf import PdfReader
         reader = PdfReader(io.BytesIO(data))
         return "\n".join(p.extract_text() or "" for p in reader.pages)
     if ext == "txt":
@@ -59,75 +66,126 @@ def _chunk_text(text: str, chunk_size: int = 500, overlap: int = 50) -> list[str
 class DocService:
     def __init__(self):
         self.collection_name = "jarvis_docs"
+        self.store = create_vector_store(collection_name=self.collection_name)
+        self.blobs = BlobStore(UPLOAD_DIR / "blobs")
+        # Query vectors depend only on the question; retrieved chunks also on the index,
+        # so their keys carry the store's generation (bumped by every upload or delete).
+        self.vector_cache = LRUCache("query_vector", get_cache_size("QUERY_VECTOR_CACHE_SIZE", 4096))
+        self.retrieval_cache = LRUCache("retrieval", get_cache_size("RETRIEVAL_CACHE_SIZE", 1024))
+        self._cached_generation = None
+
+    def warm_embedder(self) -> None:
+        """Load the embedding model and run one encode so the first request pays nothing."""
+        _get_embeddings().embed_query("warmup")
+
+    def warm_vector_store(self) -> None:
+        self.store.warm()
+        VECTOR_COUNT.set(self.store.count())
 
     async def upload(self, data: bytes, filename: str) -> str:
-        text = _extract_text(data, filename)
-        if not text.strip():
-            raise ValueError("No text extracted from document")
+        # Parsing, embedding and indexing are CPU/IO bound; keep them off the event loop
+        return await to_thread.run_sync(self._upload, data, filename)
 
+    def _upload(self, data: bytes, filename: str) -> str:
         doc_id = hashlib.md5(data).hexdigest()[:12]
-        path = UPLOAD_DIR / f"{doc_id}_{filename}"
-        path.write_bytes(data)
+        if self.store.count({"doc_id": doc_id}):
+            return doc_id  # Same content already indexed
+        text = self._document_text(doc_id, data, filename)
+        if not text.strip():
+            raise ValueError("No text extracted from document")
+        # The original and its extracted text are kept together (compressed when that helps)
+        self.blobs.put_sync(
+            data,
+            label=doc_id,
+            derivatives={TEXT_DERIVATIVE: text.encode()},
+            compress=True,
+            meta={"filename": filename},
+        )
 
         try:
             embeddings = _get_embeddings()
-            client = _get_chroma()
-            collection = client.get_or_create_collection(
-                self.collection_name,
-                metadata={"hnsw:space": "cosine"},
-            )
-
-            chunks = _chunk_text(text)
+            with stage("chunk"):
+                chunks = _chunk_text(text)
             ids = [f"{doc_id}_{i}" for i in range(len(chunks))]
-            vectors = embeddings.embed_documents(chunks)
-            collection.add(
+            with stage("embed"):
+                vectors = embeddings.embed_documents(chunks)
+            self.store.add(
                 ids=ids,
-                embeddings=vectors,
+                vectors=vectors,
                 documents=chunks,
                 metadatas=[{"doc_id": doc_id, "filename": filename}] * len(chunks),
             )
+            VECTOR_COUNT.set(self.store.count())
         except Exception as e:
-            path.unlink(missing_ok=True)
+            self.blobs.remove(doc_id, purge=True)
             raise e
 
         return doc_id
 
+    def _document_text(self, doc_id: str, data: bytes, filename: str) -> str:
+        """Extracted text of a document, from the stored derivative when it was seen before."""
+        ref = self.blobs.ref(doc_id)
+        if ref is not None:
+            text = self.blobs.get_derivative(ref["digest"], TEXT_DERIVATIVE)
+            if text is not None:
+                return text.decode()
+        with stage("extract_text"):
+            return _extract_text(data, filename)
+
     async def query(self, question: str) -> dict:
-        try:
-            embeddings = _get_embeddings()
-            client = _get_chroma()
-            try:
-                collection = client.get_collection(self.collection_name)
-            except Exception:
-                return {
-                    "answer": "No documents uploaded yet. Upload documents first to ask questions.",
-                    "sources": [],
-                }
-        except Exception:
+        hits = await to_thread.run_sync(self._retrieve, question)
+        if hits is None:
             return {
                 "answer": "No documents uploaded yet. Upload documents first to ask questions.",
                 "sources": [],
             }
 
-        query_embedding = embeddings.embed_query(question)
-        results = collection.query(
-            query_embeddings=[query_embedding],
-            n_results=5,
-            include=["documents", "metadatas"],
-        )
-
-        if not results["documents"] or not results["documents"][0]:
+        if not hits:
             return {
                 "answer": "No relevant content found in documents.",
                 "sources": [],
             }
 
-        context = "\n\n".join(results["documents"][0])
+        context = "\n\n".join(hit["document"] for hit in hits)
         answer = await self._generate_answer(question, context)
-        sources = list({m.get("filename", "") for m in (results["metadatas"] or [[]])[0]})
+        sources = list({hit["metadata"].get("filename", "") for hit in hits})
 
         return {"answer": answer, "sources": sources, "context": context[:500]}
 
+    def _retrieve(self, question: str, top_k: int = 5, where: "dict | None" = None) -> "list[dict] | None":
+        """Embed the question and search the store, through the caches. None if there is nothing to search."""
+        try:
+            embeddings = _get_embeddings()
+            # Read before searching: a write that lands mid-search bumps it past this value
+            generation = self.store.generation()
+            if not self.store.count():
+                return None
+        except Exception:
+            return None
+        if generation != self._cached_generation:
+            self.retrieval_cache.clear()  # Entries of older generations can never hit again
+            self._cached_generation = generation
+
+        question_key = normalize_question(question)
+        query_vector = self.vector_cache.get(question_key)
+        if query_vector is None:
+            with stage("embed"):
+                query_vector = np.asarray(embeddings.embed_query(question_key), dtype=np.float32)
+            self.vector_cache.put(question_key, query_vector)
+
+        key = (
+            generation,
+            hashlib.blake2b(query_vector.tobytes(), digest_size=16).digest(),
+            top_k,
+            tuple(sorted((where or {}).items())),
+        )
+        hits = self.retrieval_cache.get(key)
+        if hits is None:
+            with stage("vector_query"):
+                hits = self.store.query(query_vector, top_k=top_k, where=where)
+            self.retrieval_cache.put(key, hits)
+        return hits
+
     async def _generate_answer(self, question: str, context: str) -> str:
         if os.getenv("OPENAI_API_KEY"):
             try:
@@ -139,23 +197,37 @@ class DocService:
                     SystemMessage(content="Answer based only on the context. Say 'I don't know' if not found."),
                     HumanMessage(content=f"Context:\n{context}\n\nQuestion: {question}"),
                 ]
-                resp = await llm.ainvoke(msgs)
+                with stage("llm"):
+                    resp = await llm.ainvoke(msgs)
                 return resp.content
             except Exception:
                 pass
         return f"Relevant excerpt from documents:\n\n{context[:400]}..."
 
+    async def delete(self, doc_id: str) -> int:
+        """Remove a document's chunks and stored upload. Returns the number of chunks removed."""
+        return await to_thread.run_sync(self._delete, doc_id)
+
+    def _delete(self, doc_id: str) -> int:
+        if not re.fullmatch(r"[0-9a-f]{12}", doc_id):
+            return 0
+        removed = self.store.delete({"doc_id": doc_id})
+        self.blobs.remove(doc_id, purge=True)
+        for path in UPLOAD_DIR.glob(f"{doc_id}_*"):
+            path.unlink(missing_ok=True)  # Legacy flat layout
+        VECTOR_COUNT.set(self.store.count())
+        return removed
+
     async def list_docs(self) -> list:
+        return await to_thread.run_sync(self._list_docs)
+
+    def _list_docs(self) -> list:
         try:
-            client = _get_chroma()
-            try:
-                collection = client.get_collection(self.collection_name)
-            except Exception:
-                return []
-            data = collection.get(include=["metadatas"])
+            metadatas = self.store.metadatas()
+            VECTOR_COUNT.set(len(metadatas))
             seen = set()
             docs = []
-            for m in (data.get("metadatas") or []):
+            for m in metadatas:
                 fid = m.get("doc_id", "")
                 fname = m.get("filename", "")
                 if fid and (fid, fname) not in seen:
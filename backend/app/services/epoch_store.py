@@ -0,0 +1,136 @@
+"""Files of a store shared by all worker processes through memory maps (face gallery, NumPy
+vector store).
+
+A store directory holds data files named `<kind>.<epoch>.<suffix>` and a meta.json describing
+the current generation. Writers, serialized across threads and processes by a file lock,
+append rows to the current epoch's files (or write a fresh, compacted epoch), then atomically
+replace meta.json with generation + 1. Readers stat meta.json before every read and re-map
+when it changes; files of older epochs are deleted once a newer epoch is published.
+"""
+import json
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Called with (meta, signature of the meta.json it came from) to map a generation
+Remap = Callable[[dict, tuple], None]
+
+
+@contextmanager
+def file_lock(path: Path):
+    """Exclusive lock on `path` (created if missing) across worker processes: flock, or on
+    Windows a lock on the file's first byte."""
+    with open(path, "a+") as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        else:
+            lock_file.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    pass  # LK_LOCK gives up after 10 one-second retries; keep waiting
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class EpochStore:
+    def __init__(self, store_dir: Path):
+        self.store_dir = store_dir
+        self._write_lock = threading.Lock()
+
+    @property
+    def meta_path(self) -> Path:
+        return self.store_dir / "meta.json"
+
+    def path(self, kind: str, epoch: int, suffix: str) -> Path:
+        return self.store_dir / f"{kind}.{epoch}.{suffix}"
+
+    def signature(self) -> "tuple | None":
+        """Identity of the current meta.json; changes with every publish. None if no store exists."""
+        try:
+            st = os.stat(self.meta_path)
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+    def read_meta(self) -> "dict | None":
+        try:
+            with open(self.meta_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def refresh(self, signature: "tuple | None", remap: Remap) -> bool:
+        """Re-map through `remap` if meta.json changed since `signature`. False if no store exists."""
+        for _ in range(3):
+            current = self.signature()
+            if current is None:
+                return False
+            if current == signature:
+                return True
+            meta = self.read_meta()
+            try:
+                if meta is not None:
+                    remap(meta, current)
+                    return True
+            except (FileNotFoundError, ValueError):
+                pass  # Compacted away between reading meta and mapping; read the new meta
+        raise RuntimeError(f"Store is unreadable: {self.store_dir}")
+
+    @contextmanager
+    def locked(self):
+        """Serialize writers across threads and worker processes."""
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+        with self._write_lock, file_lock(self.store_dir / "lock"):
+            yield
+
+    def publish(self, meta: dict, remap: Remap) -> None:
+        """Atomically replace meta.json with the next generation, map it, then drop stale epochs.
+        Caller holds the lock."""
+        meta["generation"] += 1
+        tmp = self.meta_path.with_suffix(".tmp")
+        with open(tmp, "w") as f:
+            json.dump(meta, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.meta_path)
+        remap(meta, self.signature())
+        for path in self.store_dir.glob("*.*.*"):
+            epoch = path.name.split(".")[1]
+            if epoch.isdigit() and int(epoch) < meta["epoch"]:
+                try:
+                    path.unlink()
+                except OSError:
+                    pass  # Still mapped (Windows); removed by a later publish
+
+
+def append_at(path: Path, offset: int, data: bytes) -> None:
+    """Write `data` at byte `offset`, dropping anything a crashed writer left past it."""
+    with open(path, "r+b" if path.exists() else "wb") as f:
+        f.truncate(offset)
+        f.seek(offset)
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def write_file(path: Path, data: bytes) -> None:
+    with open(path, "wb") as f:
+        f.write(data)
+        os.fsync(f.fileno())
@@ -0,0 +1,467 @@
+from __future__ import annotations
+
+import io
+import os
+import queue
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Iterable
+
+from app.lazy import LazyModule
+from app.metrics import GALLERY_SAMPLES, GALLERY_SIZE, stage
+from app.services.epoch_store import EpochStore, append_at, write_file
+from app.storage import BlobStore
+
+FACE_SIZE = (100, 100)  # Normalized size for consistent matching
+CASCADE_FILE = "haarcascade_frontalface_default.xml"
+TEMPLATE_DIM = FACE_SIZE[0] * FACE_SIZE[1]
+COMPACT_MIN_DEAD_ROWS = 256  # Compact once dead rows exceed this and the live row count
+MATCH_BLOCK_ROWS = 256  # Gallery rows converted to float32 per matrix product; small enough to stay in cache
+STORE_FORMAT = 2  # 1: float32 templates next to the faces; 2: faces and their norms only
+FACES_DERIVATIVE = "faces.npy"  # Blob derivative: a label's normalized uint8 faces (k, H, W)
+
+cv2 = LazyModule("cv2")
+np = LazyModule("numpy")
+
+
+def decode_image(image_data: bytes, grayscale: bool = False) -> "np.ndarray | None":
+    """Decode uploaded image bytes to BGR (or grayscale); None if they are not an image."""
+    flags = cv2.IMREAD_GRAYSCALE if grayscale else cv2.IMREAD_COLOR
+    with stage("decode"):
+        return cv2.imdecode(np.frombuffer(image_data, np.uint8), flags)
+
+
+def _get_detector_pool() -> int:
+    """Haar cascades kept loaded per worker, one per concurrent detection. Set FACE_DETECTOR_POOL
+    in .env; default is the CPU count, at most 8 (detection is CPU bound)."""
+    try:
+        return max(1, int(os.environ.get("FACE_DETECTOR_POOL", "0")) or min(os.cpu_count() or 1, 8))
+    except (ValueError, TypeError):
+        return min(os.cpu_count() or 1, 8)
+
+
+class FaceDetector:
+    """Haar cascade face detection for the face and auth services. Decoding, detection and
+    matching are CPU bound, so the services call them from the request thread pool.
+
+    A classifier keeps scratch buffers, so two threads must never use one at once: detections
+    borrow one from a pool of FACE_DETECTOR_POOL classifiers (preloaded by warm()), and wait
+    for a free one when all are busy."""
+
+    def __init__(self):
+        self._idle: queue.SimpleQueue = queue.SimpleQueue()
+        self._loaded = 0
+        self._lock = threading.Lock()
+
+    def _load(self):
+        return cv2.CascadeClassifier(cv2.data.haarcascades + CASCADE_FILE)
+
+    def _reserve(self, wanted: int) -> int:
+        """Claim up to `wanted` classifiers still to be loaded into the pool."""
+        with self._lock:
+            n = max(0, min(wanted, _get_detector_pool() - self._loaded))
+            self._loaded += n
+            return n
+
+    @contextmanager
+    def _loading(self, n: int):
+        """Give back the reserved slots still pending (yielded as [count]) if loading fails."""
+        pending = [n]
+        try:
+            yield pending
+        except BaseException:
+            with self._lock:
+                self._loaded -= pending[0]
+            raise
+
+    @contextmanager
+    def _cascade(self):
+        try:
+            cascade = self._idle.get_nowait()
+        except queue.Empty:
+            if self._reserve(1):
+                with self._loading(1):
+                    cascade = self._load()
+            else:
+                cascade = self._idle.get()
+        try:
+            yield cascade
+        finally:
+            self._idle.put(cascade)
+
+    def warm(self) -> None:
+        """Load the whole pool, so no request pays for loading a classifier."""
+        n = self._reserve(_get_detector_pool())
+        with self._loading(n) as pending:
+            for _ in range(n):
+                self._idle.put(self._load())
+                pending[0] -= 1
+
+    def detect(self, gray: np.ndarray, min_size: tuple[int, int] = (30, 30)) -> np.ndarray:
+        """Face boxes (x, y, w, h) in a grayscale image."""
+        with stage("detect"), self._cascade() as cascade:
+            return cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=min_size)
+
+    def extract(self, img: "np.ndarray | None") -> "np.ndarray | None":
+        """Grayscale crop of the first face in a grayscale or BGR image, or None."""
+        if img is None or img.size == 0:
+            return None
+        gray = img if img.ndim == 2 else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        faces = self.detect(gray)
+        if len(faces) == 0:
+            return None
+        x, y, w, h = faces[0]
+        return gray[y : y + h, x : x + w]
+
+
+face_detector = FaceDetector()
+
+
+def normalize_face(face_roi: np.ndarray) -> np.ndarray:
+    """Normalize face for robust matching: resize, histogram equalization."""
+    resized = cv2.resize(face_roi, FACE_SIZE, interpolation=cv2.INTER_AREA)
+    return cv2.equalizeHist(resized)
+
+
+def to_templates(faces: np.ndarray) -> np.ndarray:
+    """Turn normalized uint8 faces (..., H, W) into zero-mean, unit-norm float32 rows.
+    The dot product of two templates is their normalized cross-correlation (-1..1)."""
+    vecs = faces.reshape(-1, TEMPLATE_DIM).astype(np.float32)
+    vecs -= vecs.mean(axis=1, keepdims=True)
+    norms = np.linalg.norm(vecs, axis=1, keepdims=True)
+    np.divide(vecs, norms, out=vecs, where=norms > 0)
+    return vecs
+
+
+def centered_norms(faces: np.ndarray) -> np.ndarray:
+    """Norm of each zero-mean face (..., H, W): a query template's dot product with the raw
+    pixels, divided by it, is their normalized cross-correlation (templates sum to zero)."""
+    vecs = faces.reshape(-1, TEMPLATE_DIM).astype(np.float32)
+    vecs -= vecs.mean(axis=1, keepdims=True)
+    return np.linalg.norm(vecs, axis=1)
+
+
+def face_template(face_roi: np.ndarray) -> np.ndarray:
+    """Template vector for a single grayscale face crop."""
+    return to_templates(normalize_face(face_roi))[0]
+
+
+def encode_faces(faces: np.ndarray) -> bytes:
+    """Normalized faces as .npy bytes, stored as the FACES_DERIVATIVE of a face image blob."""
+    buf = io.BytesIO()
+    np.save(buf, np.asarray(faces, dtype=np.uint8).reshape(-1, *FACE_SIZE))
+    return buf.getvalue()
+
+
+class FaceGallery:
+    """Per-label sets of face templates, shared by all worker processes through memory maps.
+
+    On-disk layout under `store_dir`:
+      faces.<epoch>.u8       uint8 normalized faces (rows, H, W), append-only
+      norms.<epoch>.f32      float32 norm of each zero-mean face (rows,), append-only
+      meta.json              format, generation, epoch, row count and each label's (start, count)
+
+    Faces are matched as stored (10 KB per sample): blocks of rows are converted to float32
+    and scored against the query templates, divided by their norms.
+
+    Readers map the arrays read-only, so N workers share one copy in the page cache. Writers
+    (serialized across processes by a file lock) append rows, then atomically replace
+    meta.json with generation + 1; every reader stats meta.json before matching and re-maps
+    when it changes. A label's rows are contiguous; replaced rows become dead and are
+    compacted into a new epoch once they outnumber live rows.
+
+    Without a store it is migrated from a legacy `<store_dir>.npz` snapshot, or rebuilt from
+    the labelled images in `blobs` (their stored normalized faces, so nothing is re-decoded)
+    plus legacy flat `legacy_dir/<label>.jpg` files, one sample per label. Images without a
+    detected face are skipped, or matched as a whole frame with `whole_frame_fallback`. A
+    store of an older format is rewritten from its faces on first load."""
+
+    def __init__(
+        self,
+        name: str,
+        store_dir: Path,
+        blobs: BlobStore,
+        extract_face: Callable[[np.ndarray], "np.ndarray | None"],
+        legacy_dir: "Path | None" = None,
+        whole_frame_fallback: bool = False,
+    ):
+        self.name = name
+        self.store_dir = store_dir
+        self.blobs = blobs
+        self.legacy_dir = legacy_dir
+        self._extract_face = extract_face
+        self._whole_frame_fallback = whole_frame_fallback
+        self._files = EpochStore(store_dir)
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._signature = None
+        self.generation = -1
+        self._labels: list[str] = []
+        self._index: dict[str, int] = {}
+
+    def _data_paths(self, epoch: int) -> tuple[Path, Path]:
+        return self._files.path("faces", epoch, "u8"), self._files.path("norms", epoch, "f32")
+
+    def _map(self, meta: dict) -> None:
+        """Point this process at `meta`'s generation. Arrays are read-only memory maps."""
+        if meta.get("format", 1) != STORE_FORMAT:
+            raise _OutdatedStore
+        rows = meta["rows"]
+        if rows:
+            faces_path, norms_path = self._data_paths(meta["epoch"])
+            faces = np.asarray(np.memmap(faces_path, np.uint8, "r", shape=(rows, TEMPLATE_DIM)))
+            norms = np.asarray(np.memmap(norms_path, np.float32, "r", shape=(rows,)))
+        else:
+            faces = np.empty((0, TEMPLATE_DIM), dtype=np.uint8)
+            norms = np.empty(0, dtype=np.float32)
+        labels = meta["labels"]
+        with self._lock:
+            self._labels = labels
+            self._index = {label: i for i, label in enumerate(labels)}
+            self._starts = np.asarray(meta["starts"], dtype=np.int64)
+            self._counts = np.asarray(meta["counts"], dtype=np.int64)
+            self._faces, self._norms = faces, norms
+            self.generation = meta["generation"]
+        GALLERY_SIZE.labels(self.name).set(len(labels))
+        GALLERY_SAMPLES.labels(self.name).set(int(self._counts.sum()))
+
+    def _adopt(self, meta: dict, signature: tuple) -> None:
+        self._map(meta)
+        self._signature = signature
+
+    def _sync(self) -> bool:
+        """Re-map if another process published a new generation. False if no store (of the
+        current format) exists."""
+        try:
+            return self._files.refresh(self._signature, self._adopt)
+        except _OutdatedStore:
+            return False
+
+    def _ensure_loaded(self) -> None:
+        if self._sync():
+            return
+        with self._load_lock:
+            if not self._sync():
+                self.reload()
+
+    @contextmanager
+    def _writer(self):
+        """Serialize writers across threads and worker processes; yields the latest meta."""
+        with self._files.locked():
+            yield self._files.read_meta() or {
+                "format": STORE_FORMAT, "generation": 0, "epoch": 0, "rows": 0,
+                "labels": [], "starts": [], "counts": [],
+            }
+
+    def _publish(self, meta: dict) -> None:
+        self._files.publish(meta, self._adopt)
+
+    def _write_epoch(self, meta: dict, labels: list[str], faces: np.ndarray, counts: list[int],
+                     norms: "np.ndarray | None" = None) -> None:
+        """Write a fresh, fully compacted epoch holding exactly `labels`. Caller holds the writer."""
+        epoch = meta["epoch"] + 1
+        faces_path, norms_path = self._data_paths(epoch)
+        write_file(faces_path, np.ascontiguousarray(faces).tobytes())
+        if norms is None:
+            norms = centered_norms(faces)
+        write_file(norms_path, np.ascontiguousarray(norms, dtype=np.float32).tobytes())
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]]).tolist() if counts else []
+        meta.update(format=STORE_FORMAT, epoch=epoch, rows=int(sum(counts)), labels=labels, starts=starts,
+                    counts=list(counts))
+
+    def _compact_if_needed(self, meta: dict) -> None:
+        live = sum(meta["counts"])
+        dead = meta["rows"] - live
+        if dead < COMPACT_MIN_DEAD_ROWS or dead <= live:
+            return
+        faces_path, norms_path = self._data_paths(meta["epoch"])
+        faces = np.memmap(faces_path, np.uint8, "r", shape=(meta["rows"], *FACE_SIZE))
+        norms = np.memmap(norms_path, np.float32, "r", shape=(meta["rows"],))
+        rows = np.concatenate([np.arange(s, s + c) for s, c in zip(meta["starts"], meta["counts"])] or [[]])
+        rows = rows.astype(np.int64)
+        self._write_epoch(meta, meta["labels"], faces[rows], meta["counts"], norms[rows])
+
+    def rebuild(self) -> None:
+        """Rebuild the gallery from the stored face images and publish it."""
+        labels, sets = self._scan()
+        with self._writer() as meta:
+            self._publish_all(meta, labels, sets)
+
+    def _scan(self) -> tuple[list[str], list[np.ndarray]]:
+        """Labels and face sets from the stored face images (and legacy flat files)."""
+        found = {}
+        for ref in self.blobs.refs():
+            faces = self._faces_from_blob(ref["digest"])
+            if faces is not None:
+                found[ref["label"]] = faces
+        if self.legacy_dir is not None:
+            for path in self.legacy_dir.glob("*.jpg"):
+                if path.stem not in found:
+                    faces = self._faces_from_image(cv2.imread(str(path), cv2.IMREAD_GRAYSCALE))
+                    if faces is not None:
+                        found[path.stem] = faces
+        labels = sorted(found)
+        return labels, [found[label] for label in labels]
+
+    def _publish_all(self, meta: dict, labels: list[str], sets: list[np.ndarray]) -> None:
+        """Publish a generation holding exactly `labels`. Caller holds the writer."""
+        faces = np.concatenate(sets) if sets else np.empty((0, *FACE_SIZE), dtype=np.uint8)
+        self._write_epoch(meta, labels, faces, [len(s) for s in sets])
+        self._publish(meta)
+
+    def reload(self) -> None:
+        """Map the published store; create it first from a legacy snapshot or the stored images.
+
+        Creation happens under the writer lock, so when several workers boot at once (or all find
+        the legacy snapshot) one builds the store and the others map what it published."""
+        self._signature = None
+        if self._sync():
+            return
+        with self._writer() as meta:
+            if self._sync():
+                return  # Another process created it while we waited for the lock
+            legacy = self.store_dir.with_suffix(".npz")
+            if meta["generation"]:  # Older format: keep its faces, drop the float32 templates
+                faces = np.fromfile(self._files.path("faces", meta["epoch"], "u8"), np.uint8,
+                                    count=meta["rows"] * TEMPLATE_DIM).reshape(-1, *FACE_SIZE)
+                sets = [faces[s : s + c] for s, c in zip(meta["starts"], meta["counts"])]
+                self._publish_all(meta, meta["labels"], sets)
+            elif legacy.exists():
+                with np.load(legacy) as data:
+                    labels = [str(label) for label in data["labels"]]
+                    faces, counts = data["faces"], data["counts"]
+                starts = np.concatenate([[0], np.cumsum(counts)[:-1]]).astype(np.int64)
+                self._publish_all(meta, labels, [faces[s : s + c] for s, c in zip(starts, counts)])
+                legacy.unlink()
+            else:
+                self._publish_all(meta, *self._scan())
+
+    def _faces_from_blob(self, digest: str) -> "np.ndarray | None":
+        """The blob's stored normalized faces; decoded (and stored) only if missing."""
+        data = self.blobs.get_derivative(digest, FACES_DERIVATIVE)
+        if data is not None:
+            return np.load(io.BytesIO(data))
+        image = self.blobs.get(digest)
+        if image is None:
+            return None
+        faces = self._faces_from_image(cv2.imdecode(np.frombuffer(image, np.uint8), cv2.IMREAD_GRAYSCALE))
+        if faces is not None:
+            self.blobs.put_derivative(digest, FACES_DERIVATIVE, encode_faces(faces))
+        return faces
+
+    def _faces_from_image(self, img: "np.ndarray | None") -> "np.ndarray | None":
+        """Normalized face of the image; None without a detected face unless whole_frame_fallback."""
+        if img is None:
+            return None
+        face_roi = self._extract_face(img)
+        if face_roi is None:
+            if not self._whole_frame_fallback:
+                return None
+            face_roi = img
+        return normalize_face(face_roi)[None]
+
+    def warm(self) -> None:
+        self._ensure_loaded()
+
+    def __len__(self) -> int:
+        """Number of labels (not samples) in the gallery."""
+        self._ensure_loaded()
+        return len(self._labels)
+
+    def add(self, label: str, faces: np.ndarray) -> None:
+        """Store normalized uint8 faces (k, H, W) as the template set of `label`, replacing any previous set."""
+        self.add_many([(label, faces)])
+
+    def add_many(self, items: Iterable[tuple[str, np.ndarray]]) -> None:
+        """Bulk add(): rows are appended once and a single new generation is published."""
+        self._ensure_loaded()
+        sets = {label: np.asarray(faces, dtype=np.uint8).reshape(-1, *FACE_SIZE) for label, faces in items}
+        if not sets:
+            return
+        new_faces = np.concatenate(list(sets.values()))
+        new_norms = centered_norms(new_faces)
+        with self._writer() as meta:
+            rows = meta["rows"]
+            faces_path, norms_path = self._data_paths(meta["epoch"])
+            append_at(faces_path, rows * TEMPLATE_DIM, new_faces.tobytes())
+            append_at(norms_path, rows * 4, new_norms.tobytes())
+            keep = [i for i, label in enumerate(meta["labels"]) if label not in sets]
+            counts = [len(faces) for faces in sets.values()]
+            starts = (rows + np.concatenate([[0], np.cumsum(counts)[:-1]])).tolist()
+            meta.update(
+                rows=rows + len(new_faces),
+                labels=[meta["labels"][i] for i in keep] + list(sets),
+                starts=[meta["starts"][i] for i in keep] + starts,
+                counts=[meta["counts"][i] for i in keep] + counts,
+            )
+            self._compact_if_needed(meta)
+            self._publish(meta)
+
+    def remove(self, label: str) -> None:
+        self._ensure_loaded()
+        with self._writer() as meta:
+            if label not in meta["labels"]:
+                return
+            i = meta["labels"].index(label)
+            for key in ("labels", "starts", "counts"):
+                meta[key] = meta[key][:i] + meta[key][i + 1 :]
+            self._compact_if_needed(meta)
+            self._publish(meta)
+
+    def match(
+        self,
+        templates: np.ndarray,
+        exclude: "set[str] | None" = None,
+        pooling: str = "max",
+    ) -> list[tuple["str | None", float]]:
+        """Match every query template against the whole gallery, MATCH_BLOCK_ROWS samples per
+        matrix product. Sample scores are pooled per label (`max` or `mean`). Returns (best_label, score) per
+        query row; (None, 0.0) when no eligible label exists."""
+        self._ensure_loaded()
+        with self._lock:
+            labels, index = self._labels, self._index
+            faces, norms, starts, counts = self._faces, self._norms, self._starts, self._counts
+        queries = np.atleast_2d(templates).astype(np.float32, copy=False)
+        if not labels or len(queries) == 0:
+            return [(None, 0.0)] * len(queries)
+
+        with stage("gallery_match"):
+            # Only score up to the last live row; dead rows between blocks land in the odd
+            # reduceat slots, which are discarded.
+            scores = _correlations(queries, faces, norms, int(starts[-1] + counts[-1]))
+            bounds = np.empty(2 * len(starts), dtype=np.int64)
+            bounds[0::2], bounds[1::2] = starts, starts + counts
+            if pooling == "mean":
+                pooled = np.add.reduceat(scores, bounds[:-1], axis=1)[:, 0::2] / counts
+            else:
+                pooled = np.maximum.reduceat(scores, bounds[:-1], axis=1)[:, 0::2]
+        if exclude:
+            mask = [index[label] for label in exclude if label in index]
+            pooled[:, mask] = -np.inf
+
+        best = pooled.argmax(axis=1)
+        results = []
+        for i, j in enumerate(best):
+            score = pooled[i, j]
+            results.append((labels[j], float(score)) if np.isfinite(score) else (None, 0.0))
+        return results
+
+
+class _OutdatedStore(Exception):
+    """meta.json describes a store of an older format."""
+
+
+def _correlations(queries: np.ndarray, faces: np.ndarray, norms: np.ndarray, rows: int) -> np.ndarray:
+    """Normalized cross-correlation of each zero-mean query template with the first `rows` faces."""
+    scores = np.empty((len(queries), rows), dtype=np.float32)
+    block = np.empty((min(MATCH_BLOCK_ROWS, rows), faces.shape[1]), dtype=np.float32)
+    for start in range(0, rows, MATCH_BLOCK_ROWS):
+        stop = min(start + MATCH_BLOCK_ROWS, rows)
+        rows_f32 = block[: stop - start]
+        rows_f32[...] = faces[start:stop]
+        np.matmul(queries, rows_f32.T, out=scores[:, start:stop])
+    block_norms = norms[:rows]
+    np.divide(scores, block_norms, out=scores, where=block_norms > 0)
+    scores[:, block_norms <= 0] = 0.0  # Blank faces correlate with nothing
+    return scores
@@ -1,32 +1,55 @@
-import io
+from __future__ import annotations
+
 import os
 from pathlib import Path
 
-import cv2
-import numpy as np
+from anyio import to_thread
+
+from app.lazy import LazyModule
+from app.services.face_gallery import (
+    FACES_DERIVATIVE,
+    FaceGallery,
+    decode_image,
+    encode_faces,
+    face_detector,
+    face_template,
+    normalize_face,
+)
+from app.storage import BlobStore
+
+cv2 = LazyModule("cv2")
+np = LazyModule("numpy")
 
-FACES_DIR = Path("./data/faces")
+FACES_DIR = Path("./data/faces")  # Flat <name>.jpg files here are legacy; new images go to blobs/
 FACES_DIR.mkdir(parents=True, exist_ok=True)
 
 
 class FaceService:
     def __init__(self):
-        self.face_cascade = cv2.CascadeClassifier(
-            cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
-        )
         self.known_faces: dict[str, list] = {}
+        self.blobs = BlobStore(FACES_DIR / "blobs")
+        self.gallery = FaceGallery(
+            "faces", FACES_DIR / "gallery", self.blobs, face_detector.extract, FACES_DIR, whole_frame_fallback=True
+        )
+
+    def _get_recognize_threshold(self) -> float:
+        """Minimum template correlation for a match. Set FACE_RECOGNIZE_CORRELATION in .env."""
+        try:
+            return float(os.environ.get("FACE_RECOGNIZE_CORRELATION", "0.88"))
+        except (ValueError, TypeError):
+            return 0.88
 
     async def analyze(self, image_data: bytes) -> dict:
         """Detect faces in image. Returns count and bounding boxes."""
-        nparr = np.frombuffer(image_data, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        return await to_thread.run_sync(self._analyze, image_data)
+
+    def _analyze(self, image_data: bytes) -> dict:
+        img = decode_image(image_data)
         if img is None:
             return {"face_count": 0, "faces": []}
 
         gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        faces = self.face_cascade.detectMultiScale(
-            gray, scaleFactor=1.1, minNeighbors=5, minSize=(30, 30)
-        )
+        faces = face_detector.detect(gray)
 
         result = []
         for (x, y, w, h) in faces:
@@ -35,52 +58,64 @@ class FaceService:
         return {"face_count": len(result), "faces": result}
 
     async def register(self, image_data: bytes, name: str) -> None:
-        """Store face image for later recognition."""
-        path = FACES_DIR / f"{name}.jpg"
-        with open(path, "wb") as f:
-            f.write(image_data)
+        """Store face image (with its normalized face) for later recognition and add it to the gallery."""
+        face = await to_thread.run_sync(self._normalized_face, image_data)
+        if face is None:
+            await self.blobs.put(image_data, label=name)
+            await to_thread.run_sync(self.gallery.remove, name)
+            return
+        await self.blobs.put(image_data, label=name, derivatives={FACES_DERIVATIVE: encode_faces(face)})
+        await to_thread.run_sync(self.gallery.add, name, face)
+
+    def _normalized_face(self, image_data: bytes) -> "np.ndarray | None":
+        """Normalized face of the image (the whole image if no face is found); None if undecodable."""
+        gray = decode_image(image_data, grayscale=True)
+        if gray is None:
+            return None
+        face_roi = face_detector.extract(gray)
+        return normalize_face(face_roi if face_roi is not None else gray)
 
     async def recognize(self, image_data: bytes) -> dict:
-        """Simple recognition: compare with registered faces. Returns best match."""
-        if not list(FACES_DIR.glob("*.jpg")):
+        """Recognize every face in the image against the gallery.
+        Top-level name/confidence describe the best-scoring face; `matches` has one entry per box."""
+        return await to_thread.run_sync(self._recognize, image_data)
+
+    def _recognize(self, image_data: bytes) -> dict:
+        if len(self.gallery) == 0:
             return {"recognized": False, "name": None}
 
-        nparr = np.frombuffer(image_data, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        img = decode_image(image_data)
         if img is None:
             return {"recognized": False, "name": None}
 
         gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        faces = self.face_cascade.detectMultiScale(
-            gray, scaleFactor=1.1, minNeighbors=5, minSize=(30, 30)
-        )
+        faces = face_detector.detect(gray)
 
         if len(faces) == 0:
-            return {"recognized": False, "name": None, "face_count": 0}
-
-        # Simple template matching - crop first face and compare with registered
-        x, y, w, h = faces[0]
-        face_roi = gray[y : y + h, x : x + w]
-
-        best_match = None
-        best_score = 0
-
-        for reg_path in FACES_DIR.glob("*.jpg"):
-            reg_img = cv2.imread(str(reg_path), cv2.IMREAD_GRAYSCALE)
-            if reg_img is None:
-                continue
-            reg_img = cv2.resize(reg_img, (face_roi.shape[1], face_roi.shape[0]))
-            score = np.mean(np.abs(reg_img.astype(float) - face_roi.astype(float)))
-            score = 1 / (1 + score)
-            if score > best_score:
-                best_score = score
-                best_match = reg_path.stem
-
+            return {"recognized": False, "name": None, "face_count": 0, "matches": []}
+
+        templates = np.stack([face_template(gray[y : y + h, x : x + w]) for (x, y, w, h) in faces])
+        threshold = self._get_recognize_threshold()
+
+        matches = []
+        for (x, y, w, h), (name, score) in zip(faces, self.gallery.match(templates)):
+            matches.append({
+                "x": int(x),
+                "y": int(y),
+                "width": int(w),
+                "height": int(h),
+                "recognized": score >= threshold,
+                "name": name,
+                "confidence": round(score, 2),
+            })
+
+        best = max(matches, key=lambda m: m["confidence"])
         return {
-            "recognized": best_score > 0.6,
-            "name": best_match,
-            "confidence": round(float(best_score), 2),
+            "recognized": best["recognized"],
+            "name": best["name"],
+            "confidence": best["confidence"],
             "face_count": len(faces),
+            "matches": matches,
         }
 
 
@@ -0,0 +1,74 @@
+"""Small in-process caches for document retrieval: question -> query vector, and
+(index generation, vector, top_k, filters) -> retrieved chunks."""
+import os
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Hashable
+
+from app.metrics import CACHE_ENTRIES, CACHE_REQUESTS
+
+
+def get_cache_size(name: str, default: int) -> int:
+    """Entry bound from env `name`; 0 disables the cache."""
+    try:
+        return max(0, int(os.getenv(name, str(default))))
+    except ValueError:
+        return default
+
+
+def normalize_question(question: str) -> str:
+    """Canonical form of a question that embeds identically with the (uncased) MiniLM model:
+    Unicode-normalized, lowercased, whitespace collapsed."""
+    return " ".join(unicodedata.normalize("NFKC", question).lower().split())
+
+
+class LRUCache:
+    """Thread-safe LRU map with hit/miss counts (also exported to /metrics)."""
+
+    def __init__(self, name: str, maxsize: int):
+        self.name = name
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Any:
+        """Cached value or None."""
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+        CACHE_REQUESTS.labels(self.name, "hit" if value is not None else "miss").inc()
+        return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        if not self.maxsize:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+            size = len(self._data)
+        CACHE_ENTRIES.labels(self.name).set(size)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+        CACHE_ENTRIES.labels(self.name).set(0)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            }
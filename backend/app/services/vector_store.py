@@ -0,0 +1,600 @@
+"""Vector stores for document chunks: Chroma, or an embedded NumPy store on memory-mapped arrays.
+
+Select with VECTOR_STORE=chroma|numpy; `python migrate_vectors.py` copies one into the other.
+Both compare vectors by cosine similarity and filter on metadata equality, e.g. {"doc_id": "abc"}."""
+from __future__ import annotations
+
+import json
+import os
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator
+
+from app.config import CHROMA_HOST, CHROMA_PERSIST_DIR, CHROMA_PORT, VECTOR_STORE, VECTOR_STORE_DIR
+from app.lazy import LazyModule
+from app.services.epoch_store import EpochStore, append_at, file_lock, write_file
+
+np = LazyModule("numpy")
+
+DTYPES = {"int8": "i8", "float16": "f16"}  # stored dtype -> file suffix
+SEARCH_BLOCK_ROWS = 8192  # Rows dequantized per matrix product; bounds scratch memory
+COMPACT_MIN_DEAD_ROWS = 1024  # Compact once deleted rows exceed this and the live row count
+IVF_MIN_ROWS_PER_LIST = 32  # Partition only once every list would get this many rows
+IVF_TRAIN_SAMPLE = 50_000
+IVF_ITERATIONS = 10
+
+
+def _get_dtype() -> str:
+    """Storage type for new NumPy stores: int8 (default, 4x smaller than float32) or float16."""
+    dtype = os.getenv("VECTOR_DTYPE", "int8").strip().lower()
+    return dtype if dtype in DTYPES else "int8"
+
+
+def _get_ivf_lists() -> int:
+    """IVF partitions for the NumPy store; 0 (default) always searches exhaustively."""
+    try:
+        return max(0, int(os.getenv("VECTOR_IVF_LISTS", "0")))
+    except ValueError:
+        return 0
+
+
+def _get_ivf_nprobe() -> int:
+    try:
+        return max(1, int(os.getenv("VECTOR_IVF_NPROBE", "8")))
+    except ValueError:
+        return 8
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+
+
+class VectorStore(ABC):
+    """Interface of the document vector stores. Results are dicts with `id`, `document`,
+    `metadata` and `score` (cosine similarity), best first."""
+
+    def warm(self) -> None:
+        self.count()
+
+    @abstractmethod
+    def count(self, where: "dict | None" = None) -> int:
+        """Rows stored, or only those whose metadata matches `where`."""
+
+    @abstractmethod
+    def generation(self) -> int:
+        """Index generation, shared by all worker processes; changes on every add or delete."""
+
+    @abstractmethod
+    def add(self, ids: list[str], vectors, documents: list[str], metadatas: list[dict]) -> None:
+        """Add new rows; ids must not already exist."""
+
+    @abstractmethod
+    def query(self, vector, top_k: int = 5, where: "dict | None" = None) -> list[dict]:
+        """The `top_k` rows closest to `vector` among those matching `where`."""
+
+    @abstractmethod
+    def metadatas(self) -> list[dict]:
+        """Metadata of every stored row."""
+
+    @abstractmethod
+    def delete(self, where: dict) -> int:
+        """Delete rows whose metadata matches `where`. Returns the number deleted."""
+
+    @abstractmethod
+    def export(self, batch_size: int = 1000) -> Iterator[tuple[list[str], list, list[str], list[dict]]]:
+        """Every row as (ids, vectors, documents, metadatas) batches, for migration."""
+
+
+def _chroma_where(where: "dict | None") -> "dict | None":
+    if not where or len(where) == 1:
+        return where or None
+    return {"$and": [{key: value} for key, value in where.items()]}
+
+
+class ChromaVectorStore(VectorStore):
+    """Chroma collection with a cosine HNSW index, embedded in `path` or on a Chroma server
+    (`host`). The embedded client keeps its HNSW index in process memory, so other processes
+    never see its writes: use a server whenever more than one worker shares the index.
+
+    The index generation is a counter file in `path`, incremented under a file lock after
+    every write (so workers sharing a server must also share `path`)."""
+
+    def __init__(self, path: Path, collection_name: str, host: "str | None" = None, port: int = 8000):
+        self.path = path
+        self.collection_name = collection_name
+        self.host = host
+        self.port = port
+        self._client = None
+        self._lock = threading.Lock()
+
+    def _get_client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    import chromadb
+                    self.path.mkdir(parents=True, exist_ok=True)
+                    if self.host:
+                        self._client = chromadb.HttpClient(host=self.host, port=self.port)
+                    else:
+                        self._client = chromadb.PersistentClient(path=str(self.path))
+        return self._client
+
+    def _collection(self, create: bool = False):
+        client = self._get_client()
+        if create:
+            return client.get_or_create_collection(self.collection_name, metadata={"hnsw:space": "cosine"})
+        try:
+            return client.get_collection(self.collection_name)
+        except Exception:
+            return None
+
+    @property
+    def _generation_path(self) -> Path:
+        return self.path / f"{self.collection_name}.generation"
+
+    def generation(self) -> int:
+        try:
+            return int(self._generation_path.read_text())
+        except FileNotFoundError:
+            return 0
+
+    def _bump_generation(self) -> None:
+        path = self._generation_path
+        with file_lock(path.with_suffix(".lock")):
+            tmp = path.with_suffix(".tmp")
+            tmp.write_text(str(self.generation() + 1))
+            os.replace(tmp, path)
+
+    def count(self, where: "dict | None" = None) -> int:
+        collection = self._collection()
+        if collection is None:
+            return 0
+        if where:
+            return len(collection.get(where=_chroma_where(where), include=[])["ids"])
+        return collection.count()
+
+    def add(self, ids: list[str], vectors, documents: list[str], metadatas: list[dict]) -> None:
+        self._collection(create=True).add(
+            ids=ids,
+            embeddings=np.asarray(vectors, dtype=np.float32).tolist(),
+            documents=documents,
+            metadatas=metadatas,
+        )
+        self._bump_generation()
+
+    def query(self, vector, top_k: int = 5, where: "dict | None" = None) -> list[dict]:
+        collection = self._collection()
+        if collection is None or collection.count() == 0:
+            return []
+        results = collection.query(
+            query_embeddings=[np.asarray(vector, dtype=np.float32).tolist()],
+            n_results=top_k,
+            where=_chroma_where(where),
+            include=["documents", "metadatas", "distances"],
+        )
+        return [
+            {"id": id_, "document": document, "metadata": metadata or {}, "score": 1.0 - distance}
+            for id_, document, metadata, distance in zip(
+                results["ids"][0], results["documents"][0], results["metadatas"][0], results["distances"][0]
+            )
+        ]
+
+    def metadatas(self) -> list[dict]:
+        collection = self._collection()
+        if collection is None:
+            return []
+        return [m or {} for m in collection.get(include=["metadatas"])["metadatas"] or []]
+
+    def delete(self, where: dict) -> int:
+        collection = self._collection()
+        if collection is None:
+            return 0
+        ids = collection.get(where=_chroma_where(where), include=[])["ids"]
+        if ids:
+            collection.delete(ids=ids)
+            self._bump_generation()
+        return len(ids)
+
+    def export(self, batch_size: int = 1000):
+        collection = self._collection()
+        if collection is None:
+            return
+        for offset in range(0, collection.count(), batch_size):
+            batch = collection.get(
+                include=["embeddings", "documents", "metadatas"], limit=batch_size, offset=offset
+            )
+            yield batch["ids"], batch["embeddings"], batch["documents"], [m or {} for m in batch["metadatas"]]
+
+
+class _MetadataColumns:
+    """Row metadata as per-key int32 codes over interned values, so filters are vectorized
+    compares and memory stays small (chunk metadata repeats per document). Immutable."""
+
+    def __init__(self, rows: int = 0, columns: "dict | None" = None):
+        self.rows = rows
+        self.columns = columns or {}  # key -> (values, {value: code}, codes; -1 = key absent)
+
+    def extended(self, metadatas: list[dict]) -> _MetadataColumns:
+        if not metadatas:
+            return self
+        columns = {}
+        for key in set(self.columns).union(*metadatas):
+            values, lookup, codes = self.columns.get(key, ([], {}, np.full(self.rows, -1, np.int32)))
+            values, lookup = list(values), dict(lookup)
+            new = np.full(len(metadatas), -1, np.int32)
+            for i, metadata in enumerate(metadatas):
+                if key in metadata:
+                    value = metadata[key]
+                    if value not in lookup:
+                        lookup[value] = len(values)
+                        values.append(value)
+                    new[i] = lookup[value]
+            columns[key] = (values, lookup, np.concatenate([codes, new]))
+        return _MetadataColumns(self.rows + len(metadatas), columns)
+
+    def mask(self, where: dict) -> np.ndarray:
+        mask = np.ones(self.rows, dtype=bool)
+        for key, value in where.items():
+            column = self.columns.get(key)
+            code = column[1].get(value) if column else None
+            if code is None:
+                return np.zeros(self.rows, dtype=bool)
+            mask &= column[2] == code
+        return mask
+
+    def row(self, i: int) -> dict:
+        return {key: values[codes[i]] for key, (values, _, codes) in self.columns.items() if codes[i] >= 0}
+
+
+@dataclass
+class _Mapped:
+    """One generation of the NumPy store as mapped by this process. Replaced, never mutated."""
+
+    generation: int
+    epoch: int
+    rows: int
+    vectors: np.ndarray
+    scales: "np.ndarray | None"
+    live: np.ndarray
+    all_live: bool
+    records: "np.ndarray | None"
+    offsets: np.ndarray  # rows + 1 byte offsets into records
+    columns: _MetadataColumns
+    centroids: "np.ndarray | None"
+    lists: "np.ndarray | None"
+
+    def record(self, row: int) -> dict:
+        return json.loads(bytes(self.records[self.offsets[row] : self.offsets[row + 1]]))
+
+    def dequantize(self, rows) -> np.ndarray:
+        vectors = self.vectors[rows].astype(np.float32)
+        if self.scales is not None:
+            vectors *= self.scales[rows, None]
+        return vectors
+
+
+class NumpyVectorStore(VectorStore):
+    """Embedded store: quantized unit vectors in memory-mapped arrays, shared by all workers.
+
+    On-disk layout under `store_dir`:
+      vectors.<epoch>.i8|f16   int8 or float16 (rows, dim), append-only
+      scales.<epoch>.f32       per-row dequantization scale (int8 only)
+      records.<epoch>.jsonl    one {"id", "document", "metadata"} line per row, append-only
+      centroids.<epoch>.f32    IVF centroids (nlist, dim), once partitioned
+      lists.<epoch>.i32        IVF list of each row, append-only
+      meta.json                generation, epoch, dtype, dim, rows, records size, deleted row ranges
+
+    As with the face gallery, writers (serialized across processes by a file lock) append
+    rows and atomically replace meta.json; readers stat it before searching and re-map when
+    it changes. Deleted rows are compacted into a new epoch once they outnumber live rows.
+
+    Search is an exact cosine scan: blocks of rows are dequantized and scored with one
+    matrix-vector product each. With VECTOR_IVF_LISTS set, rows are partitioned by spherical
+    k-means once there are enough of them, and only the VECTOR_IVF_NPROBE closest lists are scanned."""
+
+    def __init__(self, store_dir: Path, dtype: "str | None" = None, ivf_lists: "int | None" = None):
+        self.store_dir = store_dir
+        self.dtype = dtype or _get_dtype()  # Only applies when the store is created
+        self.ivf_lists = _get_ivf_lists() if ivf_lists is None else ivf_lists
+        self._files = EpochStore(store_dir)
+        self._state: "_Mapped | None" = None
+        self._signature = None
+        self._map_lock = threading.Lock()
+
+    def _path(self, kind: str, meta: dict, epoch: "int | None" = None) -> Path:
+        suffix = {"vectors": DTYPES[meta["dtype"]], "scales": "f32", "records": "jsonl",
+                  "centroids": "f32", "lists": "i32"}[kind]
+        return self._files.path(kind, meta["epoch"] if epoch is None else epoch, suffix)
+
+    def _map(self, meta: dict) -> None:
+        """Point this process at `meta`'s generation. Caller holds _map_lock."""
+        rows, dim, dtype = meta["rows"], meta["dim"], np.dtype(meta["dtype"])
+        if rows:
+            vectors = np.asarray(np.memmap(self._path("vectors", meta), dtype, "r", shape=(rows, dim)))
+            scales = (
+                np.asarray(np.memmap(self._path("scales", meta), np.float32, "r", shape=(rows,)))
+                if meta["dtype"] == "int8" else None
+            )
+            records = np.memmap(self._path("records", meta), np.uint8, "r", shape=(meta["records_size"],))
+        else:
+            vectors, scales, records = np.empty((0, dim), dtype=dtype), None, None
+        centroids = lists = None
+        if rows and meta["nlist"]:
+            centroids = np.fromfile(self._path("centroids", meta), np.float32).reshape(meta["nlist"], dim)
+            lists = np.asarray(np.memmap(self._path("lists", meta), np.int32, "r", shape=(rows,)))
+
+        # Records are append-only within an epoch: only parse lines added since the last map
+        prev = self._state
+        if prev is not None and prev.epoch == meta["epoch"] and prev.rows <= rows:
+            offsets, columns = prev.offsets, prev.columns
+        else:
+            offsets, columns = np.zeros(1, dtype=np.int64), _MetadataColumns()
+        if records is not None and offsets[-1] < meta["records_size"]:
+            lines = bytes(records[offsets[-1] :]).split(b"\n")[:-1]
+            offsets = np.concatenate([offsets, offsets[-1] + np.cumsum([len(line) + 1 for line in lines])])
+            columns = columns.extended([json.loads(line)["metadata"] for line in lines])
+
+        live = np.ones(rows, dtype=bool)
+        for start, stop in meta["dead"]:
+            live[start:stop] = False
+        self._state = _Mapped(
+            generation=meta["generation"], epoch=meta["epoch"], rows=rows, vectors=vectors, scales=scales,
+            live=live, all_live=not meta["dead"], records=records, offsets=offsets, columns=columns,
+            centroids=centroids, lists=lists,
+        )
+
+    def _adopt(self, meta: dict, signature: tuple) -> None:
+        """Caller holds _map_lock."""
+        self._map(meta)
+        self._signature = signature
+
+    def _sync(self) -> bool:
+        """Re-map if a new generation was published. False if no store exists yet."""
+        if self._signature is not None and self._files.signature() == self._signature:
+            return True
+        with self._map_lock:
+            return self._files.refresh(self._signature, self._adopt)
+
+    def _current(self) -> "_Mapped | None":
+        return self._state if self._sync() else None
+
+    @contextmanager
+    def _writer(self):
+        """Serialize writers across threads and worker processes; yields the latest meta,
+        with this process mapped to it."""
+        with self._files.locked():
+            self._sync()
+            yield self._files.read_meta() or {
+                "generation": 0, "epoch": 0, "dtype": self.dtype, "dim": 0, "rows": 0,
+                "records_size": 0, "dead": [], "nlist": 0,
+            }
+
+    def _publish(self, meta: dict) -> None:
+        def adopt(meta: dict, signature: tuple) -> None:
+            with self._map_lock:
+                self._adopt(meta, signature)
+
+        self._files.publish(meta, adopt)
+
+    def count(self, where: "dict | None" = None) -> int:
+        state = self._current()
+        if state is None:
+            return 0
+        if where:
+            return int((state.live & state.columns.mask(where)).sum())
+        return int(state.live.sum())
+
+    def generation(self) -> int:
+        state = self._current()
+        return state.generation if state is not None else 0
+
+    def add(self, ids: list[str], vectors, documents: list[str], metadatas: list[dict]) -> None:
+        if not ids:
+            return
+        vectors = _normalize(vectors)
+        records = b"".join(
+            json.dumps({"id": id_, "document": document, "metadata": metadata or {}}, ensure_ascii=False)
+            .encode() + b"\n"
+            for id_, document, metadata in zip(ids, documents, metadatas)
+        )
+        with self._writer() as meta:
+            if not meta["rows"]:
+                meta["dim"] = vectors.shape[1]
+            if vectors.shape[1] != meta["dim"]:
+                raise ValueError(f"Expected {meta['dim']}-dim vectors, got {vectors.shape[1]}")
+            rows = meta["rows"]
+            quantized, scales = _quantize(vectors, meta["dtype"])
+            append_at(self._path("vectors", meta), rows * quantized[0].nbytes, quantized.tobytes())
+            if scales is not None:
+                append_at(self._path("scales", meta), rows * 4, scales.tobytes())
+            if meta["nlist"]:
+                centroids = np.fromfile(self._path("centroids", meta), np.float32).reshape(meta["nlist"], -1)
+                append_at(self._path("lists", meta), rows * 4, _assign(vectors, centroids).tobytes())
+            append_at(self._path("records", meta), meta["records_size"], records)
+            meta.update(rows=rows + len(vectors), records_size=meta["records_size"] + len(records))
+            if not self._compact_if_needed(meta):
+                self._partition_if_needed(meta)
+            self._publish(meta)
+
+    def query(self, vector, top_k: int = 5, where: "dict | None" = None) -> list[dict]:
+        state = self._current()
+        if state is None or not state.rows or top_k <= 0:
+            return []
+        q = _normalize(vector)[0]
+        mask = None if state.all_live else state.live
+        if where:
+            mask = state.columns.mask(where) if mask is None else mask & state.columns.mask(where)
+        rows = _scan_rows(state, q, mask, top_k)
+        scores = _score(state, q, rows)
+        k = min(top_k, len(scores))
+        if not k:
+            return []
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        results = []
+        for i in best:
+            row = int(rows[i]) if rows is not None else int(i)
+            record = state.record(row)
+            results.append({**record, "score": float(scores[i])})
+        return results
+
+    def metadatas(self) -> list[dict]:
+        state = self._current()
+        if state is None:
+            return []
+        return [state.columns.row(i) for i in np.flatnonzero(state.live)]
+
+    def delete(self, where: dict) -> int:
+        if self._current() is None:
+            return 0
+        with self._writer() as meta:
+            state = self._state
+            doomed = np.flatnonzero(state.live & state.columns.mask(where))
+            if not len(doomed):
+                return 0
+            breaks = np.flatnonzero(np.diff(doomed) != 1) + 1
+            starts = doomed[np.concatenate([[0], breaks])]
+            stops = doomed[np.concatenate([breaks - 1, [len(doomed) - 1]])] + 1
+            meta["dead"] = meta["dead"] + [[int(a), int(b)] for a, b in zip(starts, stops)]
+            self._compact_if_needed(meta)
+            self._publish(meta)
+        return len(doomed)
+
+    def export(self, batch_size: int = 1000):
+        state = self._current()
+        if state is None:
+            return
+        live = np.flatnonzero(state.live)
+        for start in range(0, len(live), batch_size):
+            rows = live[start : start + batch_size]
+            records = [state.record(int(row)) for row in rows]
+            yield (
+                [r["id"] for r in records],
+                state.dequantize(rows).tolist(),
+                [r["document"] for r in records],
+                [r["metadata"] for r in records],
+            )
+
+    def _compact_if_needed(self, meta: dict) -> bool:
+        dead = sum(stop - start for start, stop in meta["dead"])
+        if dead < COMPACT_MIN_DEAD_ROWS or dead <= meta["rows"] - dead:
+            return False
+        self._rewrite(meta)
+        return True
+
+    def _rewrite(self, meta: dict) -> None:
+        """Write a new epoch holding only live rows, re-partitioned. Caller holds the writer,
+        so this process is mapped to the generation before `meta`'s pending appends."""
+        self._sync_to(meta)
+        state = self._state
+        keep = np.flatnonzero(state.live)
+        epoch = meta["epoch"] + 1
+        write_file(self._path("vectors", meta, epoch), np.ascontiguousarray(state.vectors[keep]).tobytes())
+        if state.scales is not None:
+            write_file(self._path("scales", meta, epoch), np.ascontiguousarray(state.scales[keep]).tobytes())
+        records = b"".join(bytes(state.records[state.offsets[r] : state.offsets[r + 1]]) for r in keep)
+        write_file(self._path("records", meta, epoch), records)
+        meta.update(epoch=epoch, rows=len(keep), records_size=len(records), dead=[], nlist=0)
+        self._sync_to(None)
+        self._partition_if_needed(meta, state.dequantize(keep) if len(keep) else None)
+
+    def _sync_to(self, meta: "dict | None") -> None:
+        """Map unpublished `meta` for a rewrite (None: forget it, re-map on next sync)."""
+        with self._map_lock:
+            if meta is not None:
+                self._map(meta)
+            self._signature = None
+
+    def _partition_if_needed(self, meta: dict, vectors: "np.ndarray | None" = None) -> None:
+        """Train IVF centroids once the store is large enough. Caller holds the writer."""
+        nlist = self.ivf_lists
+        if not nlist or meta["nlist"] or meta["rows"] < nlist * IVF_MIN_ROWS_PER_LIST:
+            return
+        if vectors is None:
+            self._sync_to(meta)
+            vectors = self._state.dequantize(slice(None))
+            self._sync_to(None)
+        rng = np.random.default_rng(0)
+        sample = vectors[rng.choice(len(vectors), min(len(vectors), IVF_TRAIN_SAMPLE), replace=False)]
+        centroids = _kmeans(sample, nlist, rng)
+        write_file(self._path("centroids", meta), centroids.tobytes())
+        write_file(self._path("lists", meta), _assign(vectors, centroids).tobytes())
+        meta["nlist"] = nlist
+
+
+def _scan_rows(state: _Mapped, q: np.ndarray, mask: "np.ndarray | None", top_k: int) -> "np.ndarray | None":
+    """Rows to score (None: all of them). With IVF, only the rows of the closest lists,
+    falling back to every eligible row if those hold fewer than top_k."""
+    nprobe = _get_ivf_nprobe()
+    if state.centroids is not None and nprobe < len(state.centroids):
+        probe = np.argpartition(-(state.centroids @ q), nprobe - 1)[:nprobe]
+        in_lists = np.isin(state.lists, probe)
+        candidates = in_lists if mask is None else in_lists & mask
+        rows = np.flatnonzero(candidates)
+        if len(rows) >= top_k:
+            return rows
+    return None if mask is None else np.flatnonzero(mask)
+
+
+def _score(state: _Mapped, q: np.ndarray, rows: "np.ndarray | None") -> np.ndarray:
+    """Cosine scores of `rows` (None: all rows), dequantizing SEARCH_BLOCK_ROWS at a time."""
+    n = state.rows if rows is None else len(rows)
+    scores = np.empty(n, dtype=np.float32)
+    for start in range(0, n, SEARCH_BLOCK_ROWS):
+        stop = min(start + SEARCH_BLOCK_ROWS, n)
+        block = state.vectors[start:stop] if rows is None else state.vectors[rows[start:stop]]
+        scores[start:stop] = block.astype(np.float32) @ q
+    if state.scales is not None:
+        scores *= state.scales if rows is None else state.scales[rows]
+    return scores
+
+
+def _quantize(vectors: np.ndarray, dtype: str) -> tuple[np.ndarray, "np.ndarray | None"]:
+    """Unit vectors as int8 with a per-row symmetric scale, or plain float16."""
+    if dtype == "float16":
+        return vectors.astype(np.float16), None
+    scales = np.abs(vectors).max(axis=1) / 127
+    scales[scales == 0] = 1.0
+    quantized = np.rint(vectors / scales[:, None]).astype(np.int8)
+    return quantized, scales.astype(np.float32)
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    lists = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), SEARCH_BLOCK_ROWS):
+        block = vectors[start : start + SEARCH_BLOCK_ROWS]
+        lists[start : start + len(block)] = (block @ centroids.T).argmax(axis=1)
+    return lists
+
+
+def _kmeans(x: np.ndarray, k: int, rng) -> np.ndarray:
+    """Spherical k-means: unit centroids, assignment by cosine similarity."""
+    centroids = x[rng.choice(len(x), k, replace=False)].copy()
+    for _ in range(IVF_ITERATIONS):
+        assign = _assign(x, centroids)
+        order = np.argsort(assign, kind="stable")
+        counts = np.bincount(assign, minlength=k)
+        sums = np.zeros_like(centroids)
+        used = counts > 0
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        sums[used] = np.add.reduceat(x[order], starts[used], axis=0)
+        if not used.all():  # Re-seed empty lists
+            sums[~used] = x[rng.choice(len(x), int((~used).sum()), replace=False)]
+        centroids = _normalize(sums)
+    return centroids
+
+
+def create_vector_store(kind: "str | None" = None, path: "Path | None" = None,
+                        collection_name: str = "jarvis_docs") -> VectorStore:
+    """The configured store (VECTOR_STORE), or `kind` at `path`."""
+    kind = (kind or VECTOR_STORE).strip().lower()
+    if kind == "chroma":
+        return ChromaVectorStore(path or CHROMA_PERSIST_DIR, collection_name, CHROMA_HOST, CHROMA_PORT)
+    if kind == "numpy":
+        return NumpyVectorStore(path or VECTOR_STORE_DIR)
+    raise ValueError(f"Unknown vector store '{kind}' (expected chroma or numpy)")
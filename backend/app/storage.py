@@ -0,0 +1,141 @@
+"""Content-addressed blob storage for uploads and face images.
+
+Blobs are named by their SHA-256 and spread over two levels of 256 shard directories, so no
+directory grows past a few thousand entries. Every write goes to a temp file that is fsynced
+and renamed into place, so readers (and other workers) never see partial files. Next to each
+original, compact derivatives (e.g. normalized face crops, extracted text) can be stored so
+later reads skip decoding the original. Labels (user ids, names, document ids) point at blobs
+through small ref files, sharded the same way.
+
+    objects/ab/cd/<sha256>[.gz]          original bytes, gzip-compressed when that pays off
+    objects/ab/cd/<sha256>.<kind>[.gz]   derivative
+    refs/ef/01/<sha256 of label>.json    {"label": ..., "digest": ..., "meta": {...}}
+"""
+import gzip
+import hashlib
+import json
+import os
+import uuid
+from pathlib import Path
+from typing import Iterator
+
+from anyio import to_thread
+
+COMPRESS_MIN_SAVING = 0.1  # Keep the gzip form only if it is at least 10% smaller
+
+
+def _get_compress() -> bool:
+    """Gzip compressible blobs (documents, text). Set STORAGE_COMPRESS=0 to store them raw."""
+    return os.getenv("STORAGE_COMPRESS", "1").strip().lower() not in ("0", "false", "no", "off")
+
+
+def _shard(key: str) -> Path:
+    return Path(key[:2], key[2:4])
+
+
+def write_atomic(path: Path, data: bytes) -> None:
+    """Write `data` to `path` via a fsynced temp file and rename; creates parent dirs."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    try:
+        with open(tmp, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+class BlobStore:
+    def __init__(self, root: Path):
+        self.root = root
+
+    def _object_path(self, digest: str, kind: "str | None" = None) -> Path:
+        name = digest if kind is None else f"{digest}.{kind}"
+        return self.root / "objects" / _shard(digest) / name
+
+    def _ref_path(self, label: str) -> Path:
+        key = hashlib.sha256(label.encode()).hexdigest()
+        return self.root / "refs" / _shard(key) / f"{key}.json"
+
+    def _write(self, path: Path, data: bytes, compress: bool, replace: bool = False) -> None:
+        packed_path = path.with_name(path.name + ".gz")
+        if not replace and (path.exists() or packed_path.exists()):
+            return  # Content-addressed: already stored
+        if compress and _get_compress():
+            packed = gzip.compress(data, compresslevel=6, mtime=0)
+            if len(packed) <= len(data) * (1 - COMPRESS_MIN_SAVING):
+                write_atomic(packed_path, packed)
+                path.unlink(missing_ok=True)
+                return
+        write_atomic(path, data)
+        packed_path.unlink(missing_ok=True)
+
+    def _read(self, path: Path) -> "bytes | None":
+        try:
+            return path.read_bytes()
+        except FileNotFoundError:
+            pass
+        try:
+            return gzip.decompress(path.with_name(path.name + ".gz").read_bytes())
+        except FileNotFoundError:
+            return None
+
+    def put_sync(
+        self,
+        data: bytes,
+        label: "str | None" = None,
+        derivatives: "dict[str, bytes] | None" = None,
+        compress: bool = False,
+        meta: "dict | None" = None,
+    ) -> str:
+        """Store `data` and (replacing) its derivatives, then point `label` at it. Returns the
+        digest. Derivatives are written before the ref, so a visible ref always has them."""
+        digest = hashlib.sha256(data).hexdigest()
+        self._write(self._object_path(digest), data, compress)
+        for kind, derived in (derivatives or {}).items():
+            self._write(self._object_path(digest, kind), derived, compress, replace=True)
+        if label is not None:
+            ref = json.dumps({"label": label, "digest": digest, "meta": meta or {}}).encode()
+            write_atomic(self._ref_path(label), ref)
+        return digest
+
+    async def put(self, data: bytes, label: "str | None" = None, derivatives: "dict[str, bytes] | None" = None,
+                  compress: bool = False, meta: "dict | None" = None) -> str:
+        """put_sync() in the thread pool, off the event loop."""
+        return await to_thread.run_sync(lambda: self.put_sync(data, label, derivatives, compress, meta))
+
+    def put_derivative(self, digest: str, kind: str, data: bytes, compress: bool = False) -> None:
+        self._write(self._object_path(digest, kind), data, compress, replace=True)
+
+    def get(self, digest: str) -> "bytes | None":
+        return self._read(self._object_path(digest))
+
+    def get_derivative(self, digest: str, kind: str) -> "bytes | None":
+        return self._read(self._object_path(digest, kind))
+
+    def ref(self, label: str) -> "dict | None":
+        """{"label", "digest", "meta"} for `label`, or None."""
+        try:
+            return json.loads(self._ref_path(label).read_bytes())
+        except FileNotFoundError:
+            return None
+
+    def refs(self) -> Iterator[dict]:
+        """Every ref, in no particular order."""
+        for path in (self.root / "refs").glob("*/*/*.json"):
+            try:
+                yield json.loads(path.read_bytes())
+            except (FileNotFoundError, ValueError):
+                continue  # Removed while listing
+
+    def remove(self, label: str, purge: bool = False) -> None:
+        """Drop `label`; with `purge`, also delete its blob and derivatives (only if no other
+        label can point at the same content)."""
+        ref = self.ref(label)
+        self._ref_path(label).unlink(missing_ok=True)
+        if purge and ref:
+            original = self._object_path(ref["digest"])
+            for path in original.parent.glob(f"{ref['digest']}*"):
+                path.unlink(missing_ok=True)
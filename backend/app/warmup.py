@@ -0,0 +1,37 @@
+"""Startup warm-up of heavy components, run in parallel threads and tracked for /ready."""
+import asyncio
+import time
+from typing import Callable
+
+from app.metrics import stage
+
+_status: dict[str, dict] = {}
+
+
+async def _warm_one(name: str, fn: Callable[[], None]) -> None:
+    _status[name] = {"state": "warming"}
+    start = time.perf_counter()
+    try:
+        with stage(f"warm_{name}"):
+            await asyncio.to_thread(fn)
+    except Exception as e:
+        _status[name] = {"state": "error", "error": str(e)}
+        return
+    _status[name] = {"state": "ready", "seconds": round(time.perf_counter() - start, 3)}
+
+
+def plan(components: dict[str, Callable[[], None]]) -> None:
+    """Register components as pending so /ready is accurate before warming starts."""
+    for name in components:
+        _status.setdefault(name, {"state": "pending"})
+
+
+async def warm_all(components: dict[str, Callable[[], None]]) -> None:
+    """Warm all components concurrently. Failures are recorded, never raised."""
+    plan(components)
+    await asyncio.gather(*(_warm_one(name, fn) for name, fn in components.items()))
+
+
+def readiness() -> dict:
+    ready = all(s["state"] == "ready" for s in _status.values())
+    return {"ready": ready, "components": dict(_status)}
@@ -0,0 +1 @@
+"""Reproducible benchmarks for face auth, document ingestion and retrieval. Run `python -m benchmarks`."""
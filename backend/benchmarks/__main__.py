@@ -0,0 +1,92 @@
+"""Benchmark runner. Each case runs in a fresh subprocess with its own empty working
+directory, so gallery/vector state, caches and peak RSS are isolated per case.
+
+    python -m benchmarks --out bench.json
+    python -m benchmarks --only face --users 100,1000
+    python -m benchmarks --only docs --stores chroma,numpy
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timezone
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def _git_commit() -> "str | None":
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        )
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _run_case(module: str, args: list[str], extra_env: "dict | None" = None) -> dict:
+    env = {**os.environ, "PYTHONPATH": str(BACKEND_DIR), **(extra_env or {})}
+    env.pop("OPENAI_API_KEY", None)  # LLM is stubbed; never call out
+    with tempfile.TemporaryDirectory(prefix="jarvis-bench-") as workdir:
+        proc = subprocess.run(
+            [sys.executable, "-m", module, *args], cwd=workdir, env=env, capture_output=True, text=True
+        )
+    lines = proc.stdout.strip().splitlines()
+    if proc.returncode != 0 or not lines:
+        return {"case": module, "args": args, "error": proc.stderr.strip().splitlines()[-5:]}
+    return json.loads(lines[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", default="face,docs", help="Comma-separated cases: face, docs")
+    parser.add_argument("--users", default="100,1000,10000,100000", help="Gallery sizes for the face case")
+    parser.add_argument("--probes", type=int, default=20)
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--impostors", type=int, default=50)
+    parser.add_argument("--validates", type=int, default=100)
+    parser.add_argument("--pages", default="1,10,50,200", help="PDF sizes (pages) for the docs case")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--stores", default="chroma", help="Vector stores for the docs case: chroma, numpy")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="Write JSON here instead of stdout")
+    args = parser.parse_args()
+    cases = {c.strip() for c in args.only.split(",")}
+
+    results = []
+    if "face" in cases:
+        for users in (int(u) for u in args.users.split(",") if u):
+            print(f"face: {users} users", file=sys.stderr)
+            results.append(_run_case("benchmarks.face_bench", [
+                "--users", str(users), "--probes", str(args.probes), "--logins", str(args.logins),
+                "--impostors", str(args.impostors), "--validates", str(args.validates), "--seed", str(args.seed),
+            ]))
+    if "docs" in cases:
+        for store in (s.strip() for s in args.stores.split(",") if s.strip()):
+            print(f"docs: {args.pages} pages, {store} store", file=sys.stderr)
+            results.append(_run_case("benchmarks.doc_bench", [
+                "--pages", args.pages, "--queries", str(args.queries), "--seed", str(args.seed),
+            ], {"VECTOR_STORE": store}))
+
+    report = {
+        "commit": _git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "args": vars(args),
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.out:
+        Path(args.out).write_text(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
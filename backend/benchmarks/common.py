@@ -0,0 +1,32 @@
+import json
+import resource
+import sys
+
+import numpy as np
+
+
+def latency_stats(samples: list[float]) -> dict:
+    """Summary of latencies in seconds, reported in milliseconds."""
+    if not samples:
+        return {"n": 0}
+    ms = np.asarray(samples) * 1000
+    return {
+        "n": len(samples),
+        "mean_ms": round(float(ms.mean()), 3),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "max_ms": round(float(ms.max()), 3),
+    }
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process (ru_maxrss is KiB on Linux, bytes on macOS)."""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def emit(result: dict) -> None:
+    """Print a case result as the last stdout line, for the runner to collect."""
+    result["peak_rss_mb"] = peak_rss_mb()
+    print(json.dumps(result))
@@ -0,0 +1,74 @@
+"""Document case: ingest synthetic PDFs and measure pages/sec, then query latency with a stubbed LLM,
+first for distinct questions (cache misses), then for the same questions again (retrieval cache hits).
+
+A 1-page warmup upload and a warmup query are timed separately (cold model/client load),
+so the measured numbers are steady-state. Run by the benchmark runner inside an empty
+working directory (services use ./data)."""
+import argparse
+import asyncio
+import time
+
+from benchmarks import synth
+from benchmarks.common import emit, latency_stats
+
+
+async def _stub_answer(question: str, context: str) -> str:
+    return f"Relevant excerpt from documents:\n\n{context[:400]}..."
+
+
+async def run(pages: list[int], queries: int, seed: int) -> dict:
+    from app.services.doc_service import doc_service
+
+    doc_service._generate_answer = _stub_answer
+    result: dict = {"case": "docs", "store": type(doc_service.store).__name__, "seed": seed}
+
+    t = time.perf_counter()
+    await doc_service.upload(synth.text_pdf(1, seed=seed), "warmup.pdf")
+    result["cold_ingest_s"] = round(time.perf_counter() - t, 3)
+
+    ingest, total_pages, total_s = [], 0, 0.0
+    for n in pages:
+        data = synth.text_pdf(n, seed=seed * 7919 + n)
+        t = time.perf_counter()
+        await doc_service.upload(data, f"synthetic-{n}p.pdf")
+        elapsed = time.perf_counter() - t
+        ingest.append({
+            "pages": n,
+            "bytes": len(data),
+            "seconds": round(elapsed, 3),
+            "pages_per_s": round(n / elapsed, 2),
+        })
+        total_pages += n
+        total_s += elapsed
+    result["ingest"] = ingest
+    result["ingest_pages_per_s"] = round(total_pages / total_s, 2) if total_s else None
+
+    t = time.perf_counter()
+    await doc_service.query("warmup question about the reactor")
+    result["cold_query_s"] = round(time.perf_counter() - t, 3)
+
+    questions = [" ".join(synth.words(8, seed * 104729 + i)) for i in range(queries)]
+    for name, batch in (("query", questions), ("query_repeat", [q.upper() for q in questions])):
+        latencies = []
+        for question in batch:
+            t = time.perf_counter()
+            await doc_service.query(question)
+            latencies.append(time.perf_counter() - t)
+        result[name] = latency_stats(latencies)
+    result["query_vector_cache"] = doc_service.vector_cache.stats()
+    result["retrieval_cache"] = doc_service.retrieval_cache.stats()
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", default="1,10,50,200", help="Comma-separated PDF sizes in pages")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    pages = [int(p) for p in args.pages.split(",") if p]
+    emit(asyncio.run(run(pages, args.queries, args.seed)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""Face auth case: seed a synthetic gallery, then measure login latency and validate throughput.
+
+Fillers are written straight into the gallery; probe users are enrolled through the real
+frame-selection path and log in with fresh frames, so accuracy is reported alongside latency.
+Impostors (users never enrolled) log in too; any login they get is a false accept. The best
+match scores of both groups are reported for tuning FACE_MATCH_CORRELATION.
+Run by the benchmark runner inside an empty working directory (services use ./data)."""
+import argparse
+import asyncio
+import time
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+from benchmarks import synth
+from benchmarks.common import emit, latency_stats
+
+_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
+
+
+def detectable_frames(user: int, count: int, seed: int, start: int = 0) -> list[bytes]:
+    """JPEG frames of `user` in which the cascade finds exactly one face (generated untimed)."""
+    frames, sample = [], start
+    while len(frames) < count and sample < start + 50 * count:
+        jpeg = synth.encode_jpeg(synth.face_frame(user, seed, sample))
+        img = cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_GRAYSCALE)
+        if len(_cascade.detectMultiScale(img, scaleFactor=1.1, minNeighbors=5, minSize=(50, 50))) == 1:
+            frames.append(jpeg)
+        sample += 1
+    return frames
+
+
+def score_stats(scores: list[float]) -> dict:
+    """Percentiles of best match scores."""
+    if not scores:
+        return {"n": 0}
+    s = np.asarray(scores)
+    return {
+        "n": len(scores),
+        "p5": round(float(np.percentile(s, 5)), 3),
+        "p50": round(float(np.percentile(s, 50)), 3),
+        "p95": round(float(np.percentile(s, 95)), 3),
+        "max": round(float(s.max()), 3),
+    }
+
+
+async def run(
+    users: int, probes: int, logins: int, impostors: int, validates: int, frames_per_user: int, seed: int
+) -> dict:
+    from app.services import auth_service as auth_module
+    from app.services.face_gallery import face_template
+
+    svc = auth_module.auth_service
+    probes = min(probes, users)
+    fillers = users - probes
+    result: dict = {"case": "face", "users": users, "probes": probes, "seed": seed}
+
+    t = time.perf_counter()
+    svc.gallery.add_many((f"filler-{u}", synth.filler_face(u, seed)[None]) for u in range(fillers))
+    now = datetime.utcnow().isoformat()
+    auth_module._save_users({f"filler-{u}": {"name": f"Filler {u}", "created_at": now} for u in range(fillers)})
+    result["seed_gallery_s"] = round(time.perf_counter() - t, 3)
+
+    t = time.perf_counter()
+    svc.gallery.reload()
+    result["gallery_load_s"] = round(time.perf_counter() - t, 3)
+
+    probe_ids, enroll_lat = {}, []
+    users_db = auth_module._load_users()
+    for p in range(fillers, users):
+        frames = detectable_frames(p, frames_per_user, seed)
+        if not frames:
+            continue
+        t = time.perf_counter()
+        best_image, faces = svc._select_frames(frames)
+        user_id = f"probe-{p}"
+        await svc._store_face(user_id, best_image, faces)
+        enroll_lat.append(time.perf_counter() - t)
+        users_db[user_id] = {"name": f"Probe {p}", "created_at": now}
+        probe_ids[p] = user_id
+    auth_module._save_users(users_db)
+    result["enroll"] = latency_stats(enroll_lat)
+
+    login_frames = []
+    per_probe = -(-logins // max(len(probe_ids), 1))
+    for p in sorted(probe_ids):
+        login_frames += [(p, f) for f in detectable_frames(p, per_probe, seed, start=1000)]
+    login_frames = login_frames[:logins]
+
+    # Users `users` and up are never enrolled
+    impostor_frames = []
+    for u in range(users, users + impostors):
+        impostor_frames += detectable_frames(u, 1, seed, start=1000)
+
+    login_lat = []
+
+    async def attempt(frame: bytes) -> "dict | None":
+        t = time.perf_counter()
+        try:
+            user = await svc.login(frame)
+        except ValueError:
+            user = None
+        login_lat.append(time.perf_counter() - t)
+        return user
+
+    def best_score(frame: bytes) -> float:
+        _, face_roi = svc._ensure_face(frame)
+        return svc._match_face(face_template(face_roi), include_pending=True)[1]
+
+    correct, rejected = 0, 0
+    for p, frame in login_frames:
+        user = await attempt(frame)
+        if user is None:
+            rejected += 1
+        elif user["user_id"] == probe_ids[p]:
+            correct += 1
+    accepted = 0
+    for frame in impostor_frames:
+        if await attempt(frame) is not None:
+            accepted += 1
+    result["login"] = latency_stats(login_lat)
+    result["login"]["accuracy"] = round(correct / len(login_frames), 3) if login_frames else None
+    result["login"]["rejected"] = rejected
+    result["login"]["impostors"] = len(impostor_frames)
+    result["login"]["false_accept_rate"] = round(accepted / len(impostor_frames), 3) if impostor_frames else None
+    result["scores"] = {
+        "genuine": score_stats([best_score(f) for _, f in login_frames]),
+        "impostor": score_stats([best_score(f) for f in impostor_frames]),
+    }
+
+    validate_frames = [f for _, f in login_frames][:validates] or detectable_frames(0, validates, seed)
+    t = time.perf_counter()
+    for frame in validate_frames:
+        await svc.validate_face(frame)
+    elapsed = time.perf_counter() - t
+    result["validate"] = {
+        "n": len(validate_frames),
+        "per_s": round(len(validate_frames) / elapsed, 2) if elapsed > 0 else None,
+    }
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, required=True)
+    parser.add_argument("--probes", type=int, default=20)
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--impostors", type=int, default=50, help="Login attempts by users never enrolled")
+    parser.add_argument("--validates", type=int, default=100)
+    parser.add_argument("--frames-per-user", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    emit(asyncio.run(run(
+        args.users, args.probes, args.logins, args.impostors, args.validates, args.frames_per_user, args.seed
+    )))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Deterministic synthetic inputs: cartoon face frames the Haar cascade detects, and text PDFs."""
+import zlib
+
+import cv2
+import numpy as np
+
+FRAME_SIZE = 240
+
+WORDS = (
+    "armor reactor suit flight repulsor stark tower energy shield vibranium protocol "
+    "satellite network orbital thrust module sensor array diagnostic firmware uplink "
+    "calibration thermal coolant plasma circuit relay capacitor hologram interface "
+    "engine payload altitude telemetry navigation guidance targeting override system"
+).split()
+
+
+def user_params(user: int, seed: int = 0) -> dict:
+    """Stable per-user face geometry and shading."""
+    r = np.random.default_rng([seed, user])
+    return {
+        "skin": int(r.integers(130, 175)),
+        "eye_dx": float(r.uniform(0.09, 0.13)),
+        "eye_y": float(r.uniform(0.06, 0.10)),
+        "eye_w": float(r.uniform(0.04, 0.06)),
+        "mouth_y": float(r.uniform(0.17, 0.23)),
+        "mouth_w": float(r.uniform(0.07, 0.13)),
+        "nose_len": float(r.uniform(0.06, 0.10)),
+        "texture_seed": int(r.integers(1 << 31)),
+    }
+
+
+def face_frame(user: int, seed: int = 0, sample: int = 0, size: int = FRAME_SIZE) -> np.ndarray:
+    """Grayscale frame of user `user`; `sample` varies lighting, jitter and sensor noise."""
+    p = user_params(user, seed)
+    r = np.random.default_rng([seed, user, sample, 1])
+    img = np.full((size, size), 200, np.uint8)
+    cx = size // 2 + int(r.integers(-3, 4))
+    cy = size // 2 + int(r.integers(-3, 4))
+    cv2.ellipse(img, (cx, cy), (int(size * 0.3), int(size * 0.4)), 0, 0, 360, p["skin"], -1)
+
+    texture = np.random.default_rng(p["texture_seed"]).normal(0, 4, (size // 8, size // 8))
+    texture = cv2.resize(texture, (size, size), interpolation=cv2.INTER_CUBIC)
+    face_mask = np.zeros_like(img)
+    cv2.ellipse(face_mask, (cx, cy), (int(size * 0.3), int(size * 0.4)), 0, 0, 360, 1, -1)
+    img = np.clip(img + texture * face_mask, 0, 255).astype(np.uint8)
+
+    ey, ex = cy - int(size * p["eye_y"]), int(size * p["eye_dx"])
+    for s in (-1, 1):
+        cv2.ellipse(img, (cx + s * ex, ey), (int(size * p["eye_w"]), int(size * 0.025)), 0, 0, 360, 40, -1)
+        cv2.line(img, (cx + s * ex - 15, ey - 18), (cx + s * ex + 15, ey - 18), 60, 4)
+    cv2.line(img, (cx, ey + 5), (cx, cy + int(size * p["nose_len"])), 110, 4)
+    mouth = (cx, cy + int(size * p["mouth_y"]))
+    cv2.ellipse(img, mouth, (int(size * p["mouth_w"]), int(size * 0.03)), 0, 0, 360, 70, -1)
+
+    img = cv2.GaussianBlur(img, (5, 5), 0).astype(np.float32)
+    img = img * r.uniform(0.85, 1.15) + r.uniform(-15, 15) + r.normal(0, 3, img.shape)
+    return np.clip(img, 0, 255).astype(np.uint8)
+
+
+def encode_jpeg(img: np.ndarray) -> bytes:
+    ok, buf = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, 90])
+    if not ok:
+        raise RuntimeError("JPEG encoding failed")
+    return buf.tobytes()
+
+
+def filler_face(user: int, seed: int = 0) -> np.ndarray:
+    """Normalized 100x100 face for a gallery filler, rendered without running detection.
+    The crop mirrors where the cascade boxes a face in a full frame (~74% of the side)."""
+    size, off = 135, 17
+    return cv2.equalizeHist(face_frame(user, seed, size=size)[off : off + 100, off : off + 100])
+
+
+def words(n: int, seed: int) -> list[str]:
+    r = np.random.default_rng(seed)
+    return [WORDS[i] for i in r.integers(0, len(WORDS), n)]
+
+
+def text_pdf(pages: int, seed: int = 0, lines_per_page: int = 45, words_per_line: int = 12) -> bytes:
+    """Minimal multi-page PDF with Helvetica text that pypdf can extract."""
+    objects: list[bytes] = []
+    page_ids = [3 + 2 * i for i in range(pages)]
+    font_id = 3 + 2 * pages
+    objects.append(b"<< /Type /Catalog /Pages 2 0 R >>")
+    kids = " ".join(f"{pid} 0 R" for pid in page_ids).encode()
+    objects.append(b"<< /Type /Pages /Kids [" + kids + b"] /Count " + str(pages).encode() + b" >>")
+    for i in range(pages):
+        lines = [" ".join(words(words_per_line, seed * 1_000_003 + i * 1000 + j)) for j in range(lines_per_page)]
+        ops = ["BT /F1 10 Tf 14 TL 40 800 Td"] + [f"({line}) '" for line in lines] + ["ET"]
+        stream = zlib.compress("\n".join(ops).encode())
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] /Contents {page_ids[i] + 1} 0 R "
+            f"/Resources << /Font << /F1 {font_id} 0 R >> >> >>".encode()
+        )
+        objects.append(
+            b"<< /Length " + str(len(stream)).encode() + b" /Filter /FlateDecode >>\nstream\n" + stream + b"\nendstream"
+        )
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for num, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{num} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += b"".join(f"{off:010d} 00000 n \n".encode() for off in offsets)
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return bytes(out)
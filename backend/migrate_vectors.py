@@ -0,0 +1,71 @@
+"""Copy document vectors between vector stores, e.g. from Chroma into the embedded NumPy store:
+
+    python migrate_vectors.py --from chroma --to numpy
+    python migrate_vectors.py --from chroma --to numpy --dtype float16 --verify 200
+
+Run from backend/ (stores default to ./data). Afterwards set VECTOR_STORE to the target.
+--verify re-runs N stored vectors as queries against both stores and reports top-k overlap."""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+from app.config import VECTOR_STORE_DIR
+from app.services.vector_store import DTYPES, NumpyVectorStore, create_vector_store
+
+
+def _disk_mb(path: Path) -> float:
+    return round(sum(p.stat().st_size for p in path.rglob("*") if p.is_file()) / 2**20, 1)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--from", dest="source", required=True, choices=["chroma", "numpy"])
+    parser.add_argument("--to", dest="target", required=True, choices=["chroma", "numpy"])
+    parser.add_argument("--source-dir", type=Path, help="Defaults to CHROMA_PERSIST_DIR / VECTOR_STORE_DIR")
+    parser.add_argument("--target-dir", type=Path, help="Defaults to CHROMA_PERSIST_DIR / VECTOR_STORE_DIR")
+    parser.add_argument("--dtype", choices=list(DTYPES), help="NumPy target storage type (default VECTOR_DTYPE)")
+    parser.add_argument("--ivf-lists", type=int, help="NumPy target IVF partitions (default VECTOR_IVF_LISTS)")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--verify", type=int, default=0, metavar="N", help="Compare top-k for N sampled vectors")
+    parser.add_argument("--top-k", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.source == args.target and args.source_dir == args.target_dir:
+        sys.exit("Source and target are the same store")
+    source = create_vector_store(args.source, args.source_dir)
+    if args.target == "numpy":
+        target = NumpyVectorStore(args.target_dir or VECTOR_STORE_DIR, dtype=args.dtype, ivf_lists=args.ivf_lists)
+    else:
+        target = create_vector_store("chroma", args.target_dir)
+    if target.count():
+        sys.exit(f"Target store already holds {target.count()} vectors; point --target-dir at an empty one")
+
+    start = time.perf_counter()
+    copied, samples = 0, []
+    for ids, vectors, documents, metadatas in source.export(args.batch_size):
+        target.add(ids, vectors, documents, metadatas)
+        copied += len(ids)
+        for vector in vectors:  # Reservoir sample of query vectors for --verify
+            if len(samples) < args.verify:
+                samples.append(vector)
+            elif args.verify and random.random() < args.verify / copied:
+                samples[random.randrange(args.verify)] = vector
+        print(f"copied {copied}", file=sys.stderr)
+    print(f"Migrated {copied} vectors in {time.perf_counter() - start:.1f}s")
+    for name, store in (("source", source), ("target", target)):
+        path = getattr(store, "store_dir", None) or store.path
+        print(f"{name}: {args.source if name == 'source' else args.target} at {path}, {_disk_mb(path)} MB on disk")
+
+    if samples:
+        overlap = 0.0
+        for vector in samples:
+            expected = {hit["id"] for hit in source.query(vector, args.top_k)}
+            got = {hit["id"] for hit in target.query(vector, args.top_k)}
+            overlap += len(expected & got) / max(len(expected), 1)
+        print(f"top-{args.top_k} overlap over {len(samples)} queries: {overlap / len(samples):.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,89 @@
 #!/usr/bin/env python3
-"""Run the JARVIS backend server."""
+"""Run the JARVIS backend server.
+
+    python run.py                      # development: one process, auto-reload
+    python run.py --prod [--workers N] # production: N worker processes, no reload
+
+In production mode the face galleries are memory-mapped files shared by all workers, BLAS
+thread pools are pinned to one thread per worker (scale with processes, not threads) and
+Prometheus metrics are aggregated across workers. Several workers need a vector store they
+can share: VECTOR_STORE=numpy, or Chroma as a server (CHROMA_HOST). They also share one
+embedding model, loaded by a separate server process instead of once per worker.
+"""
+import argparse
+import multiprocessing
+import os
+import secrets
+import shutil
+import sys
+from pathlib import Path
+
 import uvicorn
 
+from app.config import CHROMA_HOST, VECTOR_STORE
+
+# Thresholds on the old 1/(1 + mean abs difference) face score. Template correlations run
+# higher, so reusing those values would let impostors log in.
+RENAMED_SETTINGS = {
+    "FACE_MATCH_THRESHOLD": "FACE_MATCH_CORRELATION",
+    "FACE_RECOGNIZE_THRESHOLD": "FACE_RECOGNIZE_CORRELATION",
+}
+
+
+def _start_embedding_server() -> None:
+    """Start the shared embedding model process; workers find it through the environment."""
+    from app.embeddings import serve
+
+    if os.name == "nt":
+        address = f"127.0.0.1:{os.getenv('EMBEDDING_SERVER_PORT', '8765')}"
+    else:
+        Path("./data").mkdir(exist_ok=True)
+        address = str(Path("./data/embedder.sock").resolve())
+    key = secrets.token_hex(16)
+    process = multiprocessing.get_context("spawn").Process(
+        target=serve, args=(address, key), name="embedding-server", daemon=True
+    )
+    process.start()
+    os.environ["EMBEDDING_SERVER"] = address
+    os.environ["EMBEDDING_SERVER_KEY"] = key
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--prod", action="store_true", default=os.getenv("JARVIS_ENV") == "production")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WORKERS", os.cpu_count() or 1)))
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    args = parser.parse_args()
+
+    for old, new in RENAMED_SETTINGS.items():
+        if os.getenv(old):
+            sys.exit(
+                f"{old} is no longer read: faces are now matched by template correlation, on a "
+                f"different scale. Remove it and set {new} if the default (0.88) does not suit you; "
+                "see .env.example."
+            )
+
+    if not args.prod:
+        uvicorn.run("app.main:app", host=args.host, port=args.port, reload=True)
+        return
+
+    if args.workers > 1 and VECTOR_STORE.strip().lower() == "chroma" and not CHROMA_HOST:
+        sys.exit(
+            "Embedded Chroma keeps its index in each process, so documents uploaded through one "
+            "worker are invisible to the others. With --workers > 1 set VECTOR_STORE=numpy, or run "
+            "a Chroma server and set CHROMA_HOST (and CHROMA_PORT)."
+        )
+    if args.workers > 1:
+        _start_embedding_server()  # Before pinning BLAS threads: the model may use every core
+    for var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ.setdefault(var, "1")
+    if args.workers > 1:
+        metrics_dir = Path(os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "./data/prometheus"))
+        shutil.rmtree(metrics_dir, ignore_errors=True)
+        metrics_dir.mkdir(parents=True)
+    uvicorn.run("app.main:app", host=args.host, port=args.port, workers=args.workers)
+
+
 if __name__ == "__main__":
-    uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
+    main()